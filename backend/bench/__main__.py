@@ -0,0 +1,210 @@
+"""Load and benchmark suite for the API.
+
+Usage (from the backend directory):
+    python -m bench [--preset small|medium|large] [--languages N]
+                    [--pages N] [--keys N] [--seed N] [--no-seed]
+                    [--database NAME] [--url URL | --in-memory]
+                    [--scenarios a,b] [--concurrency 1,8,32]
+                    [--duration S] [--warmup S]
+                    [--output results.json] [--baseline baseline.json]
+                    [--tolerance 0.1]
+
+The catalog is written to the --database on the server from the
+MONGO_* settings and all of its collections are dropped first, so it
+has to be a dedicated database other than MONGO_DB. Without --url the
+app is served in-process on that database, --in-memory replaces
+MongoDB with mongomock-motor instead (see bench/requirements.txt).
+Only --url with --no-seed leaves the database alone and doesn't need
+one.
+
+The search scenario needs SEARCH_LANGUAGES on the server, it is left
+out of the in-process default run when the setting is empty.
+
+With --baseline the results are compared to a previous --output file
+and the exit status is 1 when throughput dropped or p95 latency grew by
+more than the tolerance.
+"""
+import argparse
+import asyncio
+import json
+import sys
+from typing import Any, Dict
+
+Results = Dict[str, Dict[str, Dict[str, Any]]]
+
+
+def use_in_memory_mongo() -> None:
+    try:
+        from mongomock_motor import AsyncMongoMockClient
+    except ImportError:
+        sys.exit("--in-memory needs mongomock-motor, see requirements.txt")
+
+    import motor.motor_asyncio
+
+    # Has to happen before `database` creates its client.
+    motor.motor_asyncio.AsyncIOMotorClient = AsyncMongoMockClient
+
+
+def compare(results: Results, baseline: Results, tolerance: float) -> bool:
+    """Prints the change against the baseline, False on a regression."""
+    ok = True
+
+    for name, levels in results.items():
+        for concurrency, current in levels.items():
+            previous = baseline.get(name, {}).get(concurrency)
+
+            if previous is None:
+                continue
+
+            throughput = current["throughput"] / previous["throughput"] - 1
+            p95 = current["p95"] / previous["p95"] - 1 \
+                if previous["p95"] else 0.0
+            regressed = throughput < -tolerance or p95 > tolerance
+            ok = ok and not regressed
+
+            print(
+                f"{name:<28} c={concurrency:<4} "
+                f"throughput {throughput:+7.1%}  p95 {p95:+7.1%}"
+                f"{'  REGRESSION' if regressed else ''}"
+            )
+
+    return ok
+
+
+async def main(args: argparse.Namespace) -> Results:
+    import httpx
+    import config
+    from bench.seed import PRESETS, Catalog, reset, seed
+    from bench.load import SCENARIOS, authorize, run_scenario
+
+    preset = PRESETS[args.preset]
+    catalog = Catalog(
+        languages=args.languages or preset.languages,
+        pages=args.pages or preset.pages,
+        keys=args.keys or preset.keys,
+        seed=args.seed
+    )
+    names = args.scenarios.split(",") if args.scenarios else [
+        name for name in SCENARIOS
+        if name != "search" or args.url or config.SEARCH_LANGUAGES
+    ]
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    if not args.no_seed:
+        print(
+            f"Seeding {catalog.languages} languages x {catalog.pages} pages "
+            f"x {catalog.keys} keys..."
+        )
+        await reset()
+        await seed(catalog)
+
+    results: Results = {}
+
+    async def run(client: httpx.AsyncClient) -> None:
+        headers = await authorize(client)
+
+        for name in names:
+            results[name] = {}
+
+            for concurrency in levels:
+                stats = await run_scenario(
+                    client,
+                    catalog,
+                    SCENARIOS[name],
+                    concurrency,
+                    args.duration,
+                    args.warmup,
+                    headers,
+                    args.seed
+                )
+                results[name][str(concurrency)] = stats
+
+                print(
+                    f"{name:<28} c={concurrency:<4} "
+                    f"{stats['throughput']:9.1f} req/s  "
+                    f"p50 {stats['p50']:8.2f} ms  "
+                    f"p95 {stats['p95']:8.2f} ms  "
+                    f"p99 {stats['p99']:8.2f} ms  "
+                    f"errors {stats['errors']}"
+                )
+
+    limits = httpx.Limits(max_connections=max(levels))
+
+    if args.url:
+        async with httpx.AsyncClient(
+            base_url=args.url,
+            limits=limits,
+            timeout=60
+        ) as client:
+            await run(client)
+    else:
+        from main import app
+
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app),
+                base_url="http://bench",
+                limits=limits,
+                timeout=60
+            ) as client:
+                await run(client)
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="python -m bench",
+        description="Benchmark the API against a synthetic catalog."
+    )
+    parser.add_argument(
+        "--preset",
+        choices=["small", "medium", "large"],
+        default="small"
+    )
+    parser.add_argument("--languages", type=int)
+    parser.add_argument("--pages", type=int)
+    parser.add_argument("--keys", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-seed", action="store_true")
+    parser.add_argument("--database")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url")
+    target.add_argument("--in-memory", action="store_true")
+    parser.add_argument("--scenarios")
+    parser.add_argument("--concurrency", default="1,8,32")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--warmup", type=float, default=1)
+    parser.add_argument("--output")
+    parser.add_argument("--baseline")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+
+    if args.in_memory:
+        use_in_memory_mongo()
+    elif args.database or not (args.url and args.no_seed):
+        import config
+
+        if not args.database:
+            parser.error(
+                "--database is required, its collections are dropped"
+            )
+
+        if args.database == config.MONGODB_DB:
+            parser.error("--database must not be the MONGO_DB database")
+
+        # Has to happen before `database` connects.
+        config.database_name = args.database
+
+    results = asyncio.run(main(args))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+        if not compare(results, baseline, args.tolerance):
+            sys.exit(1)
@@ -0,0 +1,147 @@
+"""Drives the API with concurrent clients and records latencies."""
+import asyncio
+import math
+import random
+import time
+import httpx
+from typing import Any, Awaitable, Callable, Dict, List
+from bench.seed import ADMIN_LOGIN, ADMIN_PASSWORD, Catalog
+
+Scenario = Callable[
+    [httpx.AsyncClient, Catalog, random.Random, Dict[str, str]],
+    Awaitable[httpx.Response]
+]
+
+
+async def get_pages(client, catalog, rng, headers):
+    after = rng.choice(catalog.page_names)
+
+    return await client.get(
+        "/translations/pages",
+        params={"limit": 10, "after": after}
+    )
+
+
+async def get_page(client, catalog, rng, headers):
+    return await client.get(
+        f"/translations/pages/{rng.choice(catalog.page_names)}"
+    )
+
+
+async def set_translation_entry_lang(client, catalog, rng, headers):
+    page_name = rng.choice(catalog.page_names)
+    key = catalog.key(rng.randrange(catalog.keys))
+    lang = rng.choice(catalog.langs)
+
+    return await client.put(
+        f"/translations/pages/{page_name}/{key}/{lang}/set",
+        json={"text": catalog.words(rng, 4)},
+        headers=headers
+    )
+
+
+async def get_bundle(client, catalog, rng, headers):
+    return await client.get(
+        f"/translations/bundles/{rng.choice(catalog.langs)}"
+    )
+
+
+async def search(client, catalog, rng, headers):
+    return await client.get(
+        "/translations/search",
+        params={"q": catalog.words(rng, 1)[:4], "limit": 20}
+    )
+
+
+async def get_coverage(client, catalog, rng, headers):
+    return await client.get("/translations/coverage", params={"limit": 100})
+
+
+async def login(client, catalog, rng, headers):
+    return await client.post(
+        "/users/login",
+        data={"username": ADMIN_LOGIN, "password": ADMIN_PASSWORD}
+    )
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "get_pages": get_pages,
+    "get_page": get_page,
+    "set_translation_entry_lang": set_translation_entry_lang,
+    "get_bundle": get_bundle,
+    "search": search,
+    "get_coverage": get_coverage,
+    "login": login
+}
+
+
+def percentile(latencies: List[float], p: float) -> float:
+    """Nearest-rank percentile of sorted latencies, in milliseconds."""
+    if not latencies:
+        return 0.0
+
+    return latencies[max(0, math.ceil(p / 100 * len(latencies)) - 1)] * 1000
+
+
+async def authorize(client: httpx.AsyncClient) -> Dict[str, str]:
+    response = await client.post(
+        "/users/login",
+        data={"username": ADMIN_LOGIN, "password": ADMIN_PASSWORD}
+    )
+    response.raise_for_status()
+
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    catalog: Catalog,
+    scenario: Scenario,
+    concurrency: int,
+    duration: float,
+    warmup: float,
+    headers: Dict[str, str],
+    seed: int = 0
+) -> Dict[str, Any]:
+    """Keeps `concurrency` clients busy for `duration` seconds."""
+    latencies: List[float] = []
+    errors = 0
+
+    async def worker(index: int, until: float, record: bool) -> None:
+        nonlocal errors
+        rng = random.Random(f"{seed}:{index}:{record}")
+
+        while time.perf_counter() < until:
+            started = time.perf_counter()
+            response = await scenario(client, catalog, rng, headers)
+            elapsed = time.perf_counter() - started
+
+            if not record:
+                continue
+
+            if response.status_code >= 400:
+                errors += 1
+            else:
+                latencies.append(elapsed)
+
+    if warmup:
+        until = time.perf_counter() + warmup
+        await asyncio.gather(
+            *(worker(i, until, False) for i in range(concurrency))
+        )
+
+    started = time.perf_counter()
+    until = started + duration
+    await asyncio.gather(*(worker(i, until, True) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": len(latencies) / elapsed,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99)
+    }
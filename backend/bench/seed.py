@@ -0,0 +1,129 @@
+"""Fills the configured database with a synthetic translation catalog.
+
+Everything is derived from a seed, so the same arguments always produce
+the same catalog and runs can be compared with each other.
+"""
+import random
+import config
+from dataclasses import dataclass
+from typing import Iterator, List, Tuple
+from database import db_connection, db_languages, db_users
+from storage import translation_store
+from coverage import coverage
+from models.users import User
+from models.translations import Language
+from utils import hash_password
+
+ADMIN_LOGIN = "bench-admin"
+ADMIN_PASSWORD = "bench-password"
+
+# Every collection the backend writes to.
+COLLECTIONS = [
+    "users",
+    "languages",
+    "translations",
+    "translation_pages",
+    "translation_entries",
+    "changes",
+    "counters",
+    "coverage",
+    "cache_versions",
+    "settings"
+]
+
+_SYLLABLES = [
+    "ka", "lo", "mi", "ne", "ru", "sa", "to", "vi", "ze", "po",
+    "da", "fe", "gu", "hi", "jo", "be", "ci", "wu", "xo", "yi"
+]
+
+
+@dataclass
+class Catalog:
+    languages: int
+    pages: int
+    keys: int
+    seed: int = 0
+
+    @property
+    def langs(self) -> List[str]:
+        return [f"l{i:02d}" for i in range(self.languages)]
+
+    @property
+    def page_names(self) -> List[str]:
+        return [f"page{i:05d}" for i in range(self.pages)]
+
+    def key(self, index: int) -> str:
+        return f"key{index:04d}"
+
+    def words(self, rng: random.Random, count: int) -> str:
+        return " ".join(
+            "".join(rng.choices(_SYLLABLES, k=rng.randint(2, 4)))
+            for _ in range(count)
+        )
+
+    def records(
+        self,
+        page_name: str
+    ) -> Iterator[Tuple[str, str, str, str]]:
+        rng = random.Random(f"{self.seed}:{page_name}")
+
+        for index in range(self.keys):
+            for lang in self.langs:
+                yield (
+                    page_name,
+                    self.key(index),
+                    lang,
+                    self.words(rng, rng.randint(1, 8))
+                )
+
+
+PRESETS = {
+    "small": Catalog(languages=5, pages=50, keys=50),
+    "medium": Catalog(languages=20, pages=500, keys=200),
+    "large": Catalog(languages=50, pages=2000, keys=500)
+}
+
+
+async def reset() -> None:
+    for name in COLLECTIONS:
+        await db_connection.getCollection(name).drop()
+
+
+async def seed(catalog: Catalog, pages_per_batch: int = 10) -> None:
+    await db_connection.ensure_indexes()
+
+    await db_languages.insert_many([
+        dict(Language(code=lang, name=lang)) for lang in catalog.langs
+    ])
+    await db_users.insert_one(dict(User(
+        login=ADMIN_LOGIN,
+        password_hash=await hash_password(ADMIN_PASSWORD),
+        roles=["admin"]
+    )))
+
+    names = catalog.page_names
+
+    for start in range(0, len(names), pages_per_batch):
+        batch = names[start:start + pages_per_batch]
+
+        await translation_store.add_pages(batch)
+        await translation_store.add_entries(
+            (page_name, catalog.key(index))
+            for page_name in batch
+            for index in range(catalog.keys)
+        )
+
+        items = []
+
+        for page_name in batch:
+            for record in catalog.records(page_name):
+                items.append(record)
+
+                if len(items) >= config.IMPORT_BATCH_SIZE:
+                    await translation_store.set_translations(items)
+                    items = []
+
+        if items:
+            await translation_store.set_translations(items)
+
+    await coverage.rebuild()
@@ -0,0 +1,409 @@
+import asyncio
+import struct
+import msgpack
+import orjson
+import config
+from typing import Any, Callable, Dict, List, Set, Tuple, Union
+from database import db_languages
+from changelog import ChangeLog, ChangeLogExpired, change_log
+from storage import TranslationStore, translation_store
+from cache import cache_invalidator
+
+Texts = Dict[str, Dict[str, str]]
+
+
+def compile_json(lang: str, texts: Texts) -> bytes:
+    return orjson.dumps(
+        {
+            f"{page}.{key}": text
+            for page, page_texts in texts.items()
+            for key, text in page_texts.items()
+        }
+    )
+
+
+def compile_msgpack(lang: str, texts: Texts) -> bytes:
+    return msgpack.packb(
+        {
+            f"{page}.{key}": text
+            for page, page_texts in texts.items()
+            for key, text in page_texts.items()
+        }
+    )
+
+
+def _gettext_hash(message: bytes) -> int:
+    # hashpjw, the function GNU gettext uses for its lookup table.
+    value = 0
+
+    for byte in message:
+        value = ((value << 4) + byte) & 0xffffffff
+        high = value & 0xf0000000
+
+        if high:
+            value ^= high >> 24
+            value ^= high
+
+    return value
+
+
+def _next_prime(number: int) -> int:
+    number |= 1
+
+    while any(number % i == 0 for i in range(3, int(number ** 0.5) + 1, 2)):
+        number += 2
+
+    return number
+
+
+def compile_mo(lang: str, texts: Texts) -> bytes:
+    """Builds a GNU .mo catalog with its hash table.
+
+    The page is the message context and the key is the msgid, so clients
+    look strings up with pgettext(page, key).
+    """
+    messages = {
+        b"": (
+            "Content-Type: text/plain; charset=UTF-8\n"
+            f"Language: {lang}\n"
+        ).encode("utf-8")
+    }
+
+    for page, page_texts in texts.items():
+        for key, text in page_texts.items():
+            messages[f"{page}\x04{key}".encode("utf-8")] = \
+                text.encode("utf-8")
+
+    ids = sorted(messages)
+    count = len(ids)
+    hash_size = max(3, _next_prime(count * 4 // 3))
+
+    ids_offset = 28
+    strs_offset = ids_offset + count * 8
+    hash_offset = strs_offset + count * 8
+    data_offset = hash_offset + hash_size * 4
+
+    ids_table, strs_table, data = [], [], bytearray()
+
+    for msgid in ids:
+        ids_table.append((len(msgid), data_offset + len(data)))
+        data += msgid + b"\0"
+
+    for msgid in ids:
+        msgstr = messages[msgid]
+        strs_table.append((len(msgstr), data_offset + len(data)))
+        data += msgstr + b"\0"
+
+    hash_table = [0] * hash_size
+
+    for index, msgid in enumerate(ids):
+        value = _gettext_hash(msgid)
+        slot = value % hash_size
+        step = 1 + value % (hash_size - 2)
+
+        while hash_table[slot]:
+            slot = (slot + step) % hash_size
+
+        hash_table[slot] = index + 1
+
+    return b"".join([
+        struct.pack(
+            "<7I",
+            0x950412de,
+            0,
+            count,
+            ids_offset,
+            strs_offset,
+            hash_size,
+            hash_offset
+        ),
+        b"".join(struct.pack("<2I", *item) for item in ids_table),
+        b"".join(struct.pack("<2I", *item) for item in strs_table),
+        struct.pack(f"<{hash_size}I", *hash_table),
+        bytes(data)
+    ])
+
+
+# format -> (compiler, media type)
+BUNDLE_FORMATS: Dict[str, Tuple[Callable[[str, Texts], bytes], str]] = {
+    "json": (compile_json, "application/json"),
+    "msgpack": (compile_msgpack, "application/x-msgpack"),
+    "mo": (compile_mo, "application/x-gettext-translation")
+}
+
+
+def resolve(chain: List[str], texts: Dict[str, Texts]) -> Texts:
+    """Merges the texts of a fallback chain, earlier languages win."""
+    if len(chain) == 1:
+        return texts[chain[0]]
+
+    resolved: Texts = {}
+
+    for code in reversed(chain):
+        for page, page_texts in texts[code].items():
+            resolved.setdefault(page, {}).update(page_texts)
+
+    return resolved
+
+
+class BundleCache:
+    """Per-language flat `page.key -> text` bundles kept in memory.
+
+    A bundle holds the language's own texts with the gaps filled from
+    its fallback chain, e.g. pt-BR -> pt -> en. The texts of every
+    language in a chain are loaded from the store the first time the
+    bundle is requested and are then patched in place by the write
+    paths, which re-resolve just the written key in every bundle that
+    falls back to it, so reads never go to Mongo again. Every format is
+    compiled once per change and reused until the next write touching
+    that bundle. Writes made by other workers are replayed from the
+    change log once the cache invalidator reports them.
+    """
+
+    def __init__(self, store: TranslationStore, log: ChangeLog) -> None:
+        self._store = store
+        self._log = log
+        # Change log revision the loaded texts are at, None while
+        # nothing is loaded.
+        self._revision: Union[int, None] = None
+        # Set when another worker wrote pages or languages.
+        self._outdated = False
+        # Own texts of every language some bundle is made of.
+        self._texts: Dict[str, Texts] = {}
+        # Bundle language -> [language, *fallbacks].
+        self._chains: Dict[str, List[str]] = {}
+        self._resolved: Dict[str, Texts] = {}
+        self._compiled: Dict[Tuple[str, str], bytes] = {}
+        self._lock = asyncio.Lock()
+        # Languages being loaded right now, flagged True when a write
+        # touches them before the load has finished.
+        self._loading: Dict[str, bool] = {}
+
+    async def get(
+        self,
+        lang: str,
+        format: str = "json"
+    ) -> Union[bytes, None]:
+        """Returns the compiled bundle, None if the language is unknown."""
+        if self._outdated:
+            await self.sync()
+
+        compiled = self._compiled.get((lang, format))
+
+        if compiled is not None:
+            return compiled
+
+        compiler = BUNDLE_FORMATS[format][0]
+
+        async with self._lock:
+            compiled = self._compiled.get((lang, format))
+
+            if compiled is not None:
+                return compiled
+
+            if lang not in self._resolved:
+                chain = await self._chain(lang)
+
+                if chain is None:
+                    return None
+
+                missing = [code for code in chain if code not in self._texts]
+                loaded: Dict[str, Texts] = {}
+
+                # Changes made while loading are replayed on top later.
+                if self._revision is None:
+                    self._revision = await self._log.revision()
+
+                for code in missing:
+                    self._loading[code] = False
+
+                try:
+                    for code in missing:
+                        loaded[code] = await self._load(code)
+                finally:
+                    outdated = [self._loading.pop(code) for code in missing]
+
+                resolved = resolve(chain, {
+                    code: loaded[code] if code in loaded else self._texts[code]
+                    for code in chain
+                })
+
+                # A write landed during the load so the snapshot may be
+                # outdated. Serve it this once without keeping it.
+                if any(outdated):
+                    return compiler(lang, resolved)
+
+                self._texts.update(loaded)
+                self._chains[lang] = chain
+                self._resolved[lang] = resolved
+
+            compiled = compiler(lang, self._resolved[lang])
+            self._compiled[(lang, format)] = compiled
+
+            return compiled
+
+    async def _chain(self, lang: str) -> Union[List[str], None]:
+        language = await db_languages.find_one(
+            {"code": lang},
+            {"_id": 0, "fallbacks": 1}
+        )
+
+        if language is None:
+            return None
+
+        return list(dict.fromkeys([lang, *language.get("fallbacks", [])]))
+
+    async def _load(self, lang: str) -> Texts:
+        texts: Texts = {}
+
+        async for page, key, text in self._store.iter_language(lang):
+            texts.setdefault(page, {})[key] = text
+
+        return texts
+
+    def _drop_compiled(self, lang: str) -> None:
+        for format in BUNDLE_FORMATS:
+            self._compiled.pop((lang, format), None)
+
+    def _refresh(self, page_name: str, key: str, codes: Set[str]) -> None:
+        """Re-resolves a key in every bundle that uses one of `codes`."""
+        for lang, chain in self._chains.items():
+            if codes.isdisjoint(chain):
+                continue
+
+            page_texts = self._resolved[lang].setdefault(page_name, {})
+            text = next(
+                (
+                    self._texts[code][page_name][key] for code in chain
+                    if key in self._texts[code].get(page_name, {})
+                ),
+                None
+            )
+
+            if text is None:
+                page_texts.pop(key, None)
+            else:
+                page_texts[key] = text
+
+            self._drop_compiled(lang)
+
+        for code in codes:
+            if code in self._loading:
+                self._loading[code] = True
+
+    def set_translation(
+        self,
+        page_name: str,
+        key: str,
+        lang: str,
+        text: str
+    ) -> None:
+        if lang in self._texts:
+            self._texts[lang].setdefault(page_name, {})[key] = text
+
+        self._refresh(page_name, key, {lang})
+
+    def delete_entry(self, page_name: str, key: str) -> None:
+        codes = {
+            code for code, texts in self._texts.items()
+            if texts.get(page_name, {}).pop(key, None) is not None
+        }
+
+        self._refresh(page_name, key, codes | set(self._loading))
+
+    def delete_page(self, page_name: str) -> None:
+        codes = {
+            code for code, texts in self._texts.items()
+            if texts.pop(page_name, None) is not None
+        }
+
+        for lang, chain in self._chains.items():
+            if not codes.isdisjoint(chain):
+                self._resolved[lang].pop(page_name, None)
+                self._drop_compiled(lang)
+
+        for code in self._loading:
+            self._loading[code] = True
+
+    def invalidate(self, lang: str) -> None:
+        """Forgets a language and every bundle that falls back to it."""
+        self._texts.pop(lang, None)
+
+        for bundle in [
+            bundle for bundle, chain in self._chains.items() if lang in chain
+        ]:
+            del self._chains[bundle]
+            del self._resolved[bundle]
+            self._drop_compiled(bundle)
+
+        self._drop_compiled(lang)
+
+        if lang in self._loading:
+            self._loading[lang] = True
+
+    def clear(self) -> None:
+        self._texts.clear()
+        self._chains.clear()
+        self._resolved.clear()
+        self._compiled.clear()
+        self._revision = None
+
+        for code in self._loading:
+            self._loading[code] = True
+
+    def outdate(self) -> None:
+        self._outdated = True
+
+    def _apply(self, changes: Dict[str, Any]) -> None:
+        for code in changes["languages"]:
+            self.invalidate(code)
+
+        for page_name, page in changes["pages"].items():
+            if page.get("deleted") or page["reset"]:
+                self.delete_page(page_name)
+
+            if page.get("deleted"):
+                continue
+
+            for key, entry in page["entries"].items():
+                if entry is None or entry["reset"]:
+                    self.delete_entry(page_name, key)
+
+                if entry is None:
+                    continue
+
+                for lang, text in entry["translations"].items():
+                    self.set_translation(page_name, key, lang, text)
+
+    async def sync(self) -> None:
+        """Patches the loaded texts with the changes other workers made."""
+        async with self._lock:
+            self._outdated = False
+
+            while self._revision is not None:
+                try:
+                    changes = await self._log.since(
+                        self._revision,
+                        config.CHANGES_BATCH_SIZE
+                    )
+                except ChangeLogExpired:
+                    self.clear()
+                    return
+
+                self._apply(changes)
+                stalled = changes["revision"] == self._revision
+                self._revision = changes["revision"]
+
+                if changes["complete"]:
+                    return
+
+                # A write is still in flight, look again next time.
+                if stalled:
+                    self._outdated = True
+                    return
+
+
+bundle_cache = BundleCache(translation_store, change_log)
+
+cache_invalidator.subscribe("languages", bundle_cache.outdate)
+cache_invalidator.subscribe("pages", bundle_cache.outdate)
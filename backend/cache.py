@@ -0,0 +1,212 @@
+import time
+import config
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Union
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ReturnDocument
+from database import db_connection
+
+MISSING = object()
+
+
+class LRUCache:
+    """Bounded LRU cache whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, name: str, max_items: int, ttl: float) -> None:
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._max_items = max_items
+        self._ttl = ttl
+        self._items: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        # Bumped by every invalidation. Read it before loading a value
+        # and pass it to set(), which then drops values loaded from
+        # before an invalidation that landed while loading.
+        self.generation = 0
+
+    def get(self, key: Hashable) -> Any:
+        """Returns the cached value or MISSING."""
+        item = self._items.get(key)
+
+        if item is None or item[0] < time.monotonic():
+            if item is not None:
+                del self._items[key]
+
+            self.misses += 1
+            return MISSING
+
+        self._items.move_to_end(key)
+        self.hits += 1
+
+        return item[1]
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        generation: Union[int, None] = None
+    ) -> None:
+        if generation is not None and generation != self.generation:
+            return
+
+        self._items[key] = (time.monotonic() + self._ttl, value)
+        self._items.move_to_end(key)
+
+        while len(self._items) > self._max_items:
+            self._items.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        self._items.pop(key, None)
+        self.generation += 1
+
+    def clear(self) -> None:
+        self._items.clear()
+        self.generation += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "size": len(self._items),
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+class CacheInvalidator:
+    """Keeps caches of several uvicorn workers coherent.
+
+    Every namespace has a version counter document in Mongo. Writers
+    bump it, readers compare it with the version they last saw at most
+    once per `interval` seconds and drop their local copies on change.
+    """
+
+    def __init__(
+        self,
+        collection: AsyncIOMotorCollection,
+        interval: float
+    ) -> None:
+        self._collection = collection
+        self._interval = interval
+        self._versions: Dict[str, int] = {}
+        # Wall clock time of the latest write seen, by namespace.
+        self._modified: Dict[str, float] = {}
+        self._listeners: Dict[str, List[Callable[[], None]]] = {}
+        self._synced_at = 0.0
+
+    def subscribe(self, namespace: str, callback: Callable[[], None]) -> None:
+        self._listeners.setdefault(namespace, []).append(callback)
+
+    def modified_at(self, namespace: str) -> float:
+        return self._modified.get(namespace, 0.0)
+
+    def _modified_at(self, namespace: str, at: float) -> None:
+        self._modified[namespace] = max(self.modified_at(namespace), at)
+
+    def _notify(self, namespace: str) -> None:
+        for callback in self._listeners.get(namespace, []):
+            callback()
+
+    async def sync(self) -> None:
+        if time.monotonic() - self._synced_at < self._interval:
+            return
+
+        self._synced_at = time.monotonic()
+
+        async for doc in self._collection.find():
+            self._modified_at(doc["_id"], doc.get("modified_at", 0.0))
+
+            if self._versions.get(doc["_id"], 0) != doc["version"]:
+                self._versions[doc["_id"]] = doc["version"]
+                self._notify(doc["_id"])
+
+    async def bump(self, namespace: str) -> None:
+        """Announces a local write, the caller already updated its caches."""
+        # Set before the first await, so anything rendered from here on
+        # already counts as modified after this write.
+        now = time.time()
+        self._modified_at(namespace, now)
+
+        doc = await self._collection.find_one_and_update(
+            {"_id": namespace},
+            {"$inc": {"version": 1}, "$max": {"modified_at": now}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
+        # Another worker wrote in between, our copies are outdated too.
+        if doc["version"] != self._versions.get(namespace, 0) + 1:
+            self._notify(namespace)
+
+        self._versions[namespace] = doc["version"]
+
+
+cache_invalidator = CacheInvalidator(
+    db_connection.getCollection("cache_versions"),
+    config.CACHE_SYNC_INTERVAL
+)
+
+languages_cache = LRUCache(
+    "languages",
+    config.CACHE_MAX_ITEMS,
+    config.CACHE_TTL
+)
+pages_cache = LRUCache(
+    "pages",
+    config.CACHE_MAX_ITEMS,
+    config.CACHE_TTL
+)
+page_lists_cache = LRUCache(
+    "page_lists",
+    config.CACHE_MAX_ITEMS,
+    config.CACHE_TTL
+)
+users_cache = LRUCache(
+    "users",
+    config.CACHE_MAX_ITEMS,
+    config.USERS_CACHE_TTL
+)
+
+cache_invalidator.subscribe("languages", languages_cache.clear)
+cache_invalidator.subscribe("pages", pages_cache.clear)
+cache_invalidator.subscribe("pages", page_lists_cache.clear)
+cache_invalidator.subscribe("users", users_cache.clear)
+
+caches: List[LRUCache] = [
+    languages_cache,
+    pages_cache,
+    page_lists_cache,
+    users_cache
+]
+
+
+async def invalidate_languages() -> None:
+    languages_cache.clear()
+    await cache_invalidator.bump("languages")
+
+
+async def invalidate_page(page_name: str) -> None:
+    await invalidate_pages([page_name])
+
+
+async def invalidate_pages(page_names: Iterable[str]) -> None:
+    page_lists_cache.clear()
+
+    for page_name in page_names:
+        pages_cache.delete(page_name)
+
+    await cache_invalidator.bump("pages")
+
+
+async def invalidate_user(login: str) -> None:
+    await invalidate_users([login])
+
+
+async def invalidate_users(logins: Iterable[str]) -> None:
+    for login in logins:
+        users_cache.delete(login)
+
+    await cache_invalidator.bump("users")
+
+
+def cache_stats() -> List[Dict[str, Any]]:
+    return [cache.stats() for cache in caches]
@@ -0,0 +1,211 @@
+import pymongo
+import config
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Tuple, Union
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ReturnDocument
+from database import db_connection
+
+LANGUAGE_ADDED = "language_added"
+LANGUAGE_UPDATED = "language_updated"
+LANGUAGE_REMOVED = "language_removed"
+PAGE_ADDED = "page_added"
+PAGE_DELETED = "page_deleted"
+ENTRY_ADDED = "entry_added"
+ENTRY_DELETED = "entry_deleted"
+TRANSLATION_SET = "translation_set"
+
+
+class ChangeLogExpired(Exception):
+    """The requested revision is older than the retained history."""
+
+
+class ChangeLog:
+    """Append-only log of translation mutations with global revisions.
+
+    Revisions come from a counter document, so they increase
+    monotonically across all workers. Old changes expire after
+    CHANGES_RETENTION_DAYS, clients that fall behind must resync in full.
+    """
+
+    def __init__(
+        self,
+        changes: AsyncIOMotorCollection,
+        counters: AsyncIOMotorCollection
+    ) -> None:
+        self._changes = changes
+        self._counters = counters
+        self._listeners: List[Callable[[], None]] = []
+
+    def subscribe(self, callback: Callable[[], None]) -> None:
+        """Calls `callback` after every change recorded by this worker."""
+        self._listeners.append(callback)
+
+    async def _reserve(self, count: int) -> int:
+        """Reserves `count` revisions and returns the last one."""
+        counter = await self._counters.find_one_and_update(
+            {"_id": "changes"},
+            {"$inc": {"revision": count}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
+        return counter["revision"]
+
+    async def record(self, kind: str, **fields: Any) -> int:
+        return await self.record_many(kind, [fields])
+
+    async def record_many(
+        self,
+        kind: str,
+        items: List[Dict[str, Any]]
+    ) -> int:
+        """Appends one change per item and returns the last revision."""
+        if not items:
+            return await self.revision()
+
+        last = await self._reserve(len(items))
+        first = last - len(items) + 1
+        now = datetime.now(timezone.utc)
+
+        await self._changes.insert_many([
+            {"revision": first + i, "kind": kind, "at": now, **item}
+            for i, item in enumerate(items)
+        ])
+
+        for callback in self._listeners:
+            callback()
+
+        return last
+
+    async def revision(self) -> int:
+        counter = await self._counters.find_one({"_id": "changes"})
+
+        return counter["revision"] if counter else 0
+
+    async def since(self, revision: int, limit: int) -> Dict[str, Any]:
+        """Returns changes after `revision` folded into their end state.
+
+        `revision` in the result is what the client has to pass next time.
+        """
+        changes, complete = await self.read(revision, limit)
+
+        return compact(revision, changes, complete)
+
+    async def read(
+        self,
+        revision: int,
+        limit: int
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """Returns the changes after `revision` in order and if that's all.
+
+        Stops at a revision gap while the missing change may still be
+        in flight, and after `limit` changes.
+        """
+        current = await self.revision()
+
+        if revision >= current:
+            return [], True
+
+        oldest = await self._changes.find_one(
+            {}, sort=[("revision", pymongo.ASCENDING)]
+        )
+
+        if oldest is None or oldest["revision"] > revision + 1:
+            raise ChangeLogExpired()
+
+        changes = []
+        expected = revision + 1
+        settled = datetime.now(timezone.utc) - \
+            timedelta(seconds=config.CHANGES_GAP_TIMEOUT)
+
+        async for change in self._changes.find(
+            {"revision": {"$gt": revision}},
+            {"_id": 0}
+        ).sort("revision", pymongo.ASCENDING).limit(limit):
+            at = change["at"]
+
+            if at.tzinfo is None:
+                at = at.replace(tzinfo=timezone.utc)
+
+            # A writer reserved `expected` but hasn't inserted it yet.
+            if change["revision"] != expected and at > settled:
+                break
+
+            changes.append(change)
+            expected = change["revision"] + 1
+
+        last = changes[-1]["revision"] if changes else revision
+
+        return changes, last >= current
+
+
+def compact(
+    revision: int,
+    changes: List[Dict[str, Any]],
+    complete: bool
+) -> Dict[str, Any]:
+    """Folds a run of changes into the final state of what they touched.
+
+    Languages map to {"name": ..., "fallbacks": [...]} or None once
+    removed. Pages map to {"deleted": True} or {"reset": bool,
+    "entries": {...}}, where reset means the page was recreated and its
+    old contents must be dropped.
+    Entries map to None once deleted or to {"reset": bool,
+    "translations": {...}} with reset meaning the entry was recreated.
+    """
+    languages: Dict[str, Union[Dict[str, str], None]] = {}
+    pages: Dict[str, Dict[str, Any]] = {}
+
+    def page_state(name: str) -> Dict[str, Any]:
+        page = pages.get(name)
+
+        if page is None or page.get("deleted"):
+            page = {"reset": False, "entries": {}}
+            pages[name] = page
+
+        return page
+
+    for change in changes:
+        kind = change["kind"]
+
+        if kind in (LANGUAGE_ADDED, LANGUAGE_UPDATED):
+            languages[change["code"]] = {
+                "name": change["name"],
+                "fallbacks": change.get("fallbacks", [])
+            }
+        elif kind == LANGUAGE_REMOVED:
+            languages[change["code"]] = None
+        elif kind == PAGE_ADDED:
+            pages[change["page"]] = {"reset": True, "entries": {}}
+        elif kind == PAGE_DELETED:
+            pages[change["page"]] = {"deleted": True}
+        elif kind == ENTRY_ADDED:
+            page_state(change["page"])["entries"][change["key"]] = {
+                "reset": True,
+                "translations": {}
+            }
+        elif kind == ENTRY_DELETED:
+            page_state(change["page"])["entries"][change["key"]] = None
+        elif kind == TRANSLATION_SET:
+            entries = page_state(change["page"])["entries"]
+            entry = entries.get(change["key"])
+
+            if entry is None:
+                entry = {"reset": False, "translations": {}}
+                entries[change["key"]] = entry
+
+            entry["translations"][change["lang"]] = change["text"]
+
+    return {
+        "revision": changes[-1]["revision"] if changes else revision,
+        "complete": complete,
+        "languages": languages,
+        "pages": pages
+    }
+
+
+change_log = ChangeLog(
+    db_connection.getCollection("changes"),
+    db_connection.getCollection("counters")
+)
@@ -19,4 +19,115 @@ connection_string = f"mongodb://{MONGODB_HOST}:{MONGODB_PORT}"
 if MONGODB_USER and MONGODB_PASSWORD:
     connection_string = f"mongodb://{MONGODB_USER}:{MONGODB_PASSWORD}@{MONGODB_HOST}:{MONGODB_PORT}"
 
-database_name = MONGODB_DB
\ No newline at end of file
+database_name = MONGODB_DB
+
+# MongoDB client, pool sizes are per worker process and times are in
+# milliseconds. Short connect and server selection timeouts make a
+# missing database fail the startup fast instead of hanging it.
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', 100))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', 0))
+MONGO_MAX_IDLE_TIME_MS = int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', 60000))
+# Requests waiting longer than this for a pooled connection fail.
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(
+    os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', 10000)
+)
+MONGO_CONNECT_TIMEOUT_MS = int(
+    os.environ.get('MONGO_CONNECT_TIMEOUT_MS', 5000)
+)
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(
+    os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000)
+)
+# 0 waits for a reply as long as it takes.
+MONGO_SOCKET_TIMEOUT_MS = int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', 0))
+MONGO_READ_PREFERENCE = os.environ.get('MONGO_READ_PREFERENCE', 'primary')
+MONGO_READ_CONCERN = os.environ.get('MONGO_READ_CONCERN', 'local')
+# A number of nodes or 'majority'.
+MONGO_WRITE_CONCERN = os.environ.get('MONGO_WRITE_CONCERN', '1')
+MONGO_WRITE_CONCERN = int(MONGO_WRITE_CONCERN) \
+    if MONGO_WRITE_CONCERN.isdigit() else MONGO_WRITE_CONCERN
+# Unset leaves journaling to the server's default.
+MONGO_JOURNAL = os.environ.get('MONGO_JOURNAL')
+MONGO_JOURNAL = MONGO_JOURNAL.lower() in ('1', 'true', 'yes') \
+    if MONGO_JOURNAL is not None else None
+
+# 'embedded' keeps every entry of a page inside the page document,
+# 'normalized' stores one document per (page, key).
+# migrate_translations.py moves existing data from 'embedded' to
+# 'normalized', there is no way back.
+TRANSLATIONS_LAYOUT = os.environ.get('TRANSLATIONS_LAYOUT', 'embedded')
+
+# Read-through caches for languages and pages. Workers check a shared
+# version counter in Mongo at most every CACHE_SYNC_INTERVAL seconds.
+CACHE_MAX_ITEMS = int(os.environ.get('CACHE_MAX_ITEMS', 1024))
+CACHE_TTL = float(os.environ.get('CACHE_TTL', 300))
+CACHE_SYNC_INTERVAL = float(os.environ.get('CACHE_SYNC_INTERVAL', 1))
+# Authenticated users are kept for a short time only, role changes made
+# through the API drop them right away.
+USERS_CACHE_TTL = float(os.environ.get('USERS_CACHE_TTL', 30))
+# Cache-Control max-age of the read endpoints. Afterwards clients and
+# CDNs revalidate with the ETag and get a 304 straight from the cache.
+HTTP_CACHE_MAX_AGE = int(os.environ.get('HTTP_CACHE_MAX_AGE', 0))
+
+# Upper bound for the number of items accepted by batch endpoints.
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', 10000))
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 1000))
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 100))
+
+# bcrypt cost factor, stored hashes with another cost are upgraded on login.
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+# Threads hashing passwords in parallel and how many calls may wait for them.
+PASSWORD_HASH_WORKERS = int(
+    os.environ.get('PASSWORD_HASH_WORKERS', min(4, os.cpu_count() or 1))
+)
+PASSWORD_HASH_MAX_QUEUE = int(os.environ.get('PASSWORD_HASH_MAX_QUEUE', 64))
+
+# Change log behind GET /translations/changes.
+CHANGES_RETENTION_DAYS = int(os.environ.get('CHANGES_RETENTION_DAYS', 30))
+CHANGES_BATCH_SIZE = int(os.environ.get('CHANGES_BATCH_SIZE', 10000))
+# Seconds a missing revision is waited for before it's considered lost.
+CHANGES_GAP_TIMEOUT = float(os.environ.get('CHANGES_GAP_TIMEOUT', 5))
+# Live change stream: each worker polls the log every CHANGES_POLL_INTERVAL
+# seconds while clients listen. A client more than CHANGES_STREAM_BUFFER
+# events behind replays from the log instead. Idle streams get a comment
+# every CHANGES_STREAM_HEARTBEAT seconds to keep proxies from closing them.
+CHANGES_POLL_INTERVAL = float(os.environ.get('CHANGES_POLL_INTERVAL', 1))
+CHANGES_STREAM_BUFFER = int(os.environ.get('CHANGES_STREAM_BUFFER', 1000))
+CHANGES_STREAM_HEARTBEAT = float(
+    os.environ.get('CHANGES_STREAM_HEARTBEAT', 15)
+)
+
+# Comma separated language codes whose texts can be searched, keys are
+# always searchable. Every worker loads its own in-memory index of them
+# on the first search, so keep the list short on large catalogs.
+# Search is off while the list is empty.
+SEARCH_LANGUAGES = [
+    code.strip()
+    for code in os.environ.get('SEARCH_LANGUAGES', '').split(',')
+    if code.strip()
+]
+
+# Whether the app sets up indexes and counters itself when it starts
+# (see setup_database.py). gunicorn does it once before forking instead.
+SETUP_DATABASE_ON_STARTUP = os.environ.get(
+    'SETUP_DATABASE_ON_STARTUP', 'true'
+).lower() in ('1', 'true', 'yes')
+# Seconds the setup keeps retrying while MongoDB is unreachable, so a
+# database that is still starting up doesn't stop the server.
+SETUP_DATABASE_TIMEOUT = float(
+    os.environ.get('SETUP_DATABASE_TIMEOUT', 120)
+)
+
+# Production server settings, read by gunicorn.conf.py. Every worker is
+# a separate process with its own MongoDB client and caches.
+WEB_BIND = os.environ.get('WEB_BIND', '0.0.0.0:8001')
+WEB_WORKERS = int(os.environ.get('WEB_WORKERS', os.cpu_count() or 1))
+WEB_KEEPALIVE = int(os.environ.get('WEB_KEEPALIVE', 5))
+WEB_BACKLOG = int(os.environ.get('WEB_BACKLOG', 2048))
+WEB_TIMEOUT = int(os.environ.get('WEB_TIMEOUT', 60))
+# Seconds in-flight requests get to finish after SIGTERM.
+WEB_GRACEFUL_TIMEOUT = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', 30))
+
+# Responses smaller than this many bytes are sent uncompressed. Brotli
+# quality goes from 0 (fastest) to 11 (smallest).
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', 4))
@@ -0,0 +1,163 @@
+import pymongo
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Tuple, Union
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import UpdateOne
+from database import db_connection
+from storage import TranslationStore, translation_store
+
+
+class Coverage:
+    """Per page counters of entries and of entries translated per language.
+
+    The write paths adjust the counters as they go, so a report costs
+    one document per page instead of a scan of every entry. Counters
+    are kept for removed languages too, their translations stay stored
+    and count again once the language is added back.
+    """
+
+    def __init__(
+        self,
+        collection: AsyncIOMotorCollection,
+        store: TranslationStore
+    ) -> None:
+        self._collection = collection
+        self._store = store
+
+    async def ensure_built(self) -> None:
+        """Counts everything once for catalogs that predate the counters."""
+        if await self._collection.find_one({}, {"_id": 1}) is not None:
+            return
+
+        if not await self._store.list_pages(limit=1, names_only=True):
+            return
+
+        await self.rebuild()
+
+    async def rebuild(self) -> None:
+        operations = []
+
+        async for page in self._store.iter_pages():
+            translated: Counter = Counter()
+
+            for entry in page["entries"]:
+                translated.update(entry["translations"].keys())
+
+            operations.append(UpdateOne(
+                {"page": page["name"]},
+                {"$set": {
+                    "entries": len(page["entries"]),
+                    "translated": dict(translated)
+                }},
+                upsert=True
+            ))
+
+        if operations:
+            await self._collection.bulk_write(operations)
+
+    async def add_pages(self, names: Iterable[str]) -> None:
+        operations = [
+            UpdateOne(
+                {"page": name},
+                {"$setOnInsert": {"entries": 0, "translated": {}}},
+                upsert=True
+            )
+            for name in names
+        ]
+
+        if operations:
+            await self._collection.bulk_write(operations)
+
+    async def delete_page(self, name: str) -> None:
+        await self._collection.delete_one({"page": name})
+
+    async def count(
+        self,
+        entries: Union[Dict[str, int], None] = None,
+        translations: Union[Dict[Tuple[str, str], int], None] = None
+    ) -> None:
+        """Adds the deltas for pages and (page, lang) pairs.
+
+        Only pages with counters are touched. add_pages() creates them,
+        so a write racing a page deletion can't bring a page back.
+        """
+        increments: Dict[str, Dict[str, int]] = {}
+
+        for page, delta in (entries or {}).items():
+            increments.setdefault(page, {})["entries"] = delta
+
+        for (page, lang), delta in (translations or {}).items():
+            increments.setdefault(page, {})[f"translated.{lang}"] = delta
+
+        operations = [
+            UpdateOne({"page": page}, {"$inc": fields})
+            for page, fields in increments.items()
+            if any(fields.values())
+        ]
+
+        if operations:
+            await self._collection.bulk_write(operations)
+
+    async def entry_deleted(
+        self,
+        page_name: str,
+        translations: Dict[str, str]
+    ) -> None:
+        await self.count(
+            {page_name: -1},
+            {(page_name, lang): -1 for lang in translations}
+        )
+
+    async def report(
+        self,
+        languages: List[str],
+        pages: Union[List[str], None] = None,
+        after: Union[str, None] = None,
+        limit: Union[int, None] = None
+    ) -> List[Dict[str, Any]]:
+        """Returns translated and missing counts per page and language."""
+        query: Dict[str, Any] = {}
+
+        if pages is not None:
+            query["page"] = {"$in": pages}
+
+        if after is not None:
+            query.setdefault("page", {})["$gt"] = after
+
+        report = []
+
+        async for doc in self._collection.find(query).sort(
+            "page", pymongo.ASCENDING
+        ).limit(limit or 0):
+            entries = doc.get("entries", 0)
+            translated = doc.get("translated", {})
+            report.append({
+                "page": doc["page"],
+                "entries": entries,
+                "languages": {
+                    lang: {
+                        "translated": translated.get(lang, 0),
+                        "missing": entries - translated.get(lang, 0)
+                    }
+                    for lang in languages
+                }
+            })
+
+        return report
+
+    async def missing_keys(
+        self,
+        page_name: str,
+        lang: str
+    ) -> Union[List[str], None]:
+        """Returns the untranslated keys, None if the page doesn't exist."""
+        async for page in self._store.iter_pages([page_name], [lang]):
+            return [
+                entry["key"] for entry in page["entries"]
+                if lang not in entry["translations"]
+            ]
+
+        return None
+
+
+coverage = Coverage(db_connection.getCollection("coverage"), translation_store)
@@ -1,34 +1,217 @@
+import logging
 import pymongo
 import config
-from pymongo import MongoClient
-from pymongo.collection import Collection
+from typing import Any, Dict, List
+from motor.motor_asyncio import (
+    AsyncIOMotorClient,
+    AsyncIOMotorCollection
+)
+from pymongo import IndexModel
+from pymongo.errors import OperationFailure
+from metrics import CommandMetrics, PoolMetrics
+
+logger = logging.getLogger(__name__)
+
+# Every index the query paths rely on, by collection. Applied at startup,
+# indexes that are missing are built and ones whose definition changed
+# are rebuilt, the rest is left alone.
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel(
+            [('login', pymongo.ASCENDING)],
+            name='login_index',
+            unique=True
+        )
+    ],
+    "languages": [
+        IndexModel(
+            [('code', pymongo.ASCENDING)],
+            name='code_index',
+            unique=True
+        )
+    ],
+    # Embedded layout.
+    "translations": [
+        IndexModel(
+            [('name', pymongo.ASCENDING)],
+            name='name_index',
+            unique=True
+        )
+    ],
+    # Normalized layout.
+    "translation_pages": [
+        IndexModel(
+            [('name', pymongo.ASCENDING)],
+            name='name_index',
+            unique=True
+        )
+    ],
+    "translation_entries": [
+        IndexModel(
+            [('page', pymongo.ASCENDING), ('key', pymongo.ASCENDING)],
+            name='page_key_index',
+            unique=True
+        ),
+        # Entries of a page are listed in insertion order.
+        IndexModel(
+            [('page', pymongo.ASCENDING), ('_id', pymongo.ASCENDING)],
+            name='page_id_index'
+        )
+    ],
+    "changes": [
+        IndexModel(
+            [('revision', pymongo.ASCENDING)],
+            name='revision_index',
+            unique=True
+        ),
+        IndexModel(
+            [('at', pymongo.ASCENDING)],
+            name='at_ttl_index',
+            expireAfterSeconds=config.CHANGES_RETENTION_DAYS * 24 * 60 * 60
+        )
+    ],
+    "coverage": [
+        IndexModel(
+            [('page', pymongo.ASCENDING)],
+            name='page_index',
+            unique=True
+        )
+    ]
+}
+
+# Server error code for dropping an index that doesn't exist.
+INDEX_NOT_FOUND = 27
+
+# Index options that make two definitions with the same name differ.
+_INDEX_OPTIONS = ("unique", "sparse", "expireAfterSeconds")
+
+
+def client_options() -> Dict[str, Any]:
+    options: Dict[str, Any] = {
+        "maxPoolSize": config.MONGO_MAX_POOL_SIZE,
+        "minPoolSize": config.MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": config.MONGO_MAX_IDLE_TIME_MS,
+        "waitQueueTimeoutMS": config.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "connectTimeoutMS": config.MONGO_CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": config.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "socketTimeoutMS": config.MONGO_SOCKET_TIMEOUT_MS,
+        "readPreference": config.MONGO_READ_PREFERENCE,
+        "readConcernLevel": config.MONGO_READ_CONCERN,
+        "w": config.MONGO_WRITE_CONCERN,
+        "journal": config.MONGO_JOURNAL
+    }
+
+    return {
+        name: value for name, value in options.items() if value is not None
+    }
+
+
+def _same_index(current: Dict[str, Any], index: IndexModel) -> bool:
+    document = index.document
+
+    return list(current["key"]) == list(document["key"].items()) and all(
+        current.get(option) == document.get(option)
+        for option in _INDEX_OPTIONS
+    )
 
 
 class DataBaseConnection:
 
-    def __init__(self, connection_string: str, database: str) -> None:
+    def __init__(
+        self,
+        connection_string: str,
+        database: str,
+        **options: Any
+    ) -> None:
         self._connection_string: str = connection_string
-        self._client: MongoClient = MongoClient(connection_string)
+        # No connection is made before the first command, so the client
+        # never carries sockets or monitor threads across a fork.
+        self._client: AsyncIOMotorClient = AsyncIOMotorClient(
+            connection_string,
+            connect=False,
+            event_listeners=[CommandMetrics(), PoolMetrics()],
+            **options
+        )
         self._db = self._client[database]
 
-        self._db['users'].create_index(
-            [('login', pymongo.ASCENDING)],
-            name='login_index'
-        )
-        self._db['languages'].create_index(
-            [('code', pymongo.ASCENDING)],
-            name='code_index'
-        )
+    async def ensure_indexes(
+        self,
+        manifest: Dict[str, List[IndexModel]] = INDEXES
+    ) -> None:
+        """Brings the indexes of every collection in line with `manifest`.
+
+        A unique index that can't be built because of duplicates is
+        logged and the previous definition is kept, so the server still
+        starts. Running it from several processes at once is harmless.
+        """
+        for name, indexes in manifest.items():
+            collection = self._db[name]
+            current = await collection.index_information()
+
+            for index in indexes:
+                index_name = index.document["name"]
+                previous = current.get(index_name)
+
+                if previous is not None:
+                    if _same_index(previous, index):
+                        continue
 
-    def getCollection(self, name: str) -> Collection:
+                    try:
+                        await collection.drop_index(index_name)
+                    except OperationFailure as e:
+                        # Someone else dropped it in the meantime.
+                        if e.code != INDEX_NOT_FOUND:
+                            raise
+
+                try:
+                    await collection.create_indexes([index])
+                except OperationFailure as e:
+                    # Someone else built the same index in the meantime.
+                    built = (await collection.index_information()).get(
+                        index_name
+                    )
+
+                    if built is not None and _same_index(built, index):
+                        continue
+
+                    logger.error(
+                        "Can't build index %s on %s: %s",
+                        index_name,
+                        name,
+                        e
+                    )
+
+                    if previous is not None and built is None:
+                        await collection.create_indexes([IndexModel(
+                            list(previous["key"]),
+                            name=index_name,
+                            **{
+                                option: previous[option]
+                                for option in _INDEX_OPTIONS
+                                if option in previous
+                            }
+                        )])
+
+    def close(self) -> None:
+        self._client.close()
+
+    def getCollection(self, name: str) -> AsyncIOMotorCollection:
         return self._db[name]
 
 
 db_connection = DataBaseConnection(
     config.connection_string,
-    config.database_name
+    config.database_name,
+    **client_options()
 )
 
-db_users: Collection = db_connection.getCollection("users")
-db_translations: Collection = db_connection.getCollection("translations")
-db_languages: Collection = db_connection.getCollection("languages")
+db_users: AsyncIOMotorCollection = db_connection.getCollection("users")
+db_translations: AsyncIOMotorCollection = db_connection.getCollection(
+    "translations"
+)
+db_languages: AsyncIOMotorCollection = db_connection.getCollection(
+    "languages"
+)
+db_settings: AsyncIOMotorCollection = db_connection.getCollection(
+    "settings"
+)
@@ -13,6 +13,7 @@ from pydantic import ValidationError
 from models.users import User
 from schemas import UserSerializer
 from database import db_users
+from cache import MISSING, cache_invalidator, users_cache
 
 reuseable_oauth = OAuth2PasswordBearer(
     tokenUrl="/users/login",
@@ -40,8 +41,16 @@ async def get_current_user(token: str = Depends(reuseable_oauth)) -> User:
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    await cache_invalidator.sync()
+    cached_user = users_cache.get(token_data['sub'])
+
+    if cached_user is not MISSING:
+        return cached_user
+
+    # A role change during the read must not be cached over.
+    generation = users_cache.generation
     user: Union[dict[str, Any], None] = UserSerializer.serialize(
-        db_users.find_one({"login": token_data['sub']})
+        await db_users.find_one({"login": token_data['sub']})
     )
 
     if user is None:
@@ -50,4 +59,7 @@ async def get_current_user(token: str = Depends(reuseable_oauth)) -> User:
             detail="Could not find user",
         )
 
-    return User(**user)
+    cached_user = User(**user)
+    users_cache.set(token_data['sub'], cached_user, generation)
+
+    return cached_user
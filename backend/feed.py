@@ -0,0 +1,250 @@
+import asyncio
+import logging
+import orjson
+import config
+from typing import Any, AsyncIterator, Dict, List, Set, Tuple, Union
+from pymongo.errors import PyMongoError
+from changelog import ChangeLog, ChangeLogExpired, change_log
+from metrics import CHANGE_STREAM_SUBSCRIBERS
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT = b":\n\n"
+EXPIRED = b"event: expired\ndata: {}\n\n"
+
+
+def render_event(change: Dict[str, Any]) -> bytes:
+    """Formats a change as a server-sent event with its revision as id."""
+    return b"id: %d\nevent: %s\ndata: %s\n\n" % (
+        change["revision"],
+        change["kind"].encode(),
+        orjson.dumps(change)
+    )
+
+
+class Subscription:
+    """A client's view of the feed, filtered by page and language."""
+
+    def __init__(
+        self,
+        pages: Union[List[str], None],
+        langs: Union[List[str], None],
+        revision: int,
+        buffer: int
+    ) -> None:
+        self.pages = set(pages) if pages else None
+        self.langs = set(langs) if langs else None
+        # Last revision the client has seen.
+        self.revision = revision
+        # Set while events are dropped, they get replayed from the log.
+        self.lagging = False
+        self._queue: asyncio.Queue[Tuple[int, Union[bytes, None]]] = \
+            asyncio.Queue(buffer)
+
+    def matches(self, change: Dict[str, Any]) -> bool:
+        # Language changes have a code, translations a lang, both may be
+        # filtered. Changes of every language pass a language filter.
+        lang = change.get("lang", change.get("code"))
+
+        if self.langs is not None and lang is not None:
+            if lang not in self.langs:
+                return False
+
+        page = change.get("page")
+
+        return self.pages is None or page is None or page in self.pages
+
+    def put(self, revision: int, event: Union[bytes, None]) -> None:
+        if self.lagging:
+            return
+
+        try:
+            self._queue.put_nowait((revision, event))
+        except asyncio.QueueFull:
+            # Too slow to keep up. The queue is emptied and the client is
+            # woken up to replay what it missed from the log.
+            self.lagging = True
+
+            while not self._queue.empty():
+                self._queue.get_nowait()
+
+            self._queue.put_nowait((revision, None))
+
+    async def get(
+        self,
+        timeout: float
+    ) -> Union[Tuple[int, Union[bytes, None]], None]:
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class ChangeFeed:
+    """Pushes change log entries to the clients connected to this worker.
+
+    A single task reads the log while anyone listens and fans every
+    change out to the matching subscriptions, so Mongo sees one poll
+    per worker no matter how many clients there are. Each event is
+    rendered once and shared. Changes recorded by this worker wake the
+    task right away, other workers' changes arrive within
+    CHANGES_POLL_INTERVAL.
+    """
+
+    def __init__(
+        self,
+        log: ChangeLog,
+        interval: float,
+        buffer: int
+    ) -> None:
+        self._log = log
+        self._interval = interval
+        self._buffer = buffer
+        self._subscriptions: Set[Subscription] = set()
+        self._revision = 0
+        self._task: Union[asyncio.Task, None] = None
+        self._wake = asyncio.Event()
+
+        log.subscribe(self._wake.set)
+
+    def _running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def _subscribe(
+        self,
+        pages: Union[List[str], None],
+        langs: Union[List[str], None],
+        since: Union[int, None]
+    ) -> Subscription:
+        if not self._running():
+            revision = await self._log.revision()
+
+            if not self._running():
+                self._revision = revision
+                self._task = asyncio.create_task(self._run())
+
+        subscription = Subscription(
+            pages,
+            langs,
+            self._revision if since is None else since,
+            self._buffer
+        )
+        subscription.lagging = subscription.revision < self._revision
+        self._subscriptions.add(subscription)
+        CHANGE_STREAM_SUBSCRIBERS.set(len(self._subscriptions))
+
+        return subscription
+
+    async def _run(self) -> None:
+        while self._subscriptions:
+            self._wake.clear()
+
+            try:
+                changes, complete = await self._log.read(
+                    self._revision,
+                    config.CHANGES_BATCH_SIZE
+                )
+            except ChangeLogExpired:
+                # Only after a very long outage. Every client replays
+                # and is told to resync.
+                self._revision = await self._log.revision()
+
+                for subscription in self._subscriptions:
+                    subscription.put(self._revision, None)
+                    subscription.lagging = True
+
+                continue
+            except PyMongoError as e:
+                logger.error("Can't read the change log: %s", e)
+                changes, complete = [], False
+
+            for change in changes:
+                event = render_event(change)
+
+                for subscription in self._subscriptions:
+                    if subscription.matches(change):
+                        subscription.put(change["revision"], event)
+
+            if changes:
+                self._revision = changes[-1]["revision"]
+
+            if complete or not changes:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self._interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _replay(
+        self,
+        subscription: Subscription,
+        until: int
+    ) -> AsyncIterator[bytes]:
+        while subscription.revision < until:
+            changes, _ = await self._log.read(
+                subscription.revision,
+                config.CHANGES_BATCH_SIZE
+            )
+
+            if not changes:
+                break
+
+            for change in changes:
+                if subscription.matches(change):
+                    yield render_event(change)
+
+            subscription.revision = changes[-1]["revision"]
+
+    async def stream(
+        self,
+        pages: Union[List[str], None] = None,
+        langs: Union[List[str], None] = None,
+        since: Union[int, None] = None
+    ) -> AsyncIterator[bytes]:
+        """Yields events after `since`, or from now on, until cancelled.
+
+        Ends with an `expired` event when `since` is older than the
+        retained history.
+        """
+        subscription = await self._subscribe(pages, langs, since)
+
+        try:
+            while True:
+                if subscription.lagging:
+                    subscription.lagging = False
+
+                    try:
+                        async for event in self._replay(
+                            subscription,
+                            self._revision
+                        ):
+                            yield event
+                    except ChangeLogExpired:
+                        yield EXPIRED
+                        return
+
+                    continue
+
+                item = await subscription.get(config.CHANGES_STREAM_HEARTBEAT)
+
+                if item is None:
+                    yield HEARTBEAT
+                    continue
+
+                revision, event = item
+
+                # Replayed already, or a wake-up to start replaying.
+                if event is None or revision <= subscription.revision:
+                    continue
+
+                subscription.revision = revision
+                yield event
+        finally:
+            self._subscriptions.discard(subscription)
+            CHANGE_STREAM_SUBSCRIBERS.set(len(self._subscriptions))
+
+
+change_feed = ChangeFeed(
+    change_log,
+    config.CHANGES_POLL_INTERVAL,
+    config.CHANGES_STREAM_BUFFER
+)
@@ -0,0 +1,63 @@
+"""Production server: gunicorn managing uvicorn workers.
+
+Usage:
+    gunicorn -c gunicorn.conf.py main:app
+
+The app is imported by every worker after the fork (preload_app stays
+off), so each worker creates its own MongoDB client. SIGTERM stops
+accepting connections and gives in-flight requests WEB_GRACEFUL_TIMEOUT
+seconds to finish before the shutdown hooks close the client.
+
+Indexes and counters are set up once by setup_database.py before the
+workers start, a failure there stops gunicorn.
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+# The master sets the database up once, before any worker starts.
+os.environ["SETUP_DATABASE_ON_STARTUP"] = "false"
+
+# Any module level name that matches a gunicorn setting is read as one.
+import config as settings  # noqa: E402
+
+bind = settings.WEB_BIND
+workers = settings.WEB_WORKERS
+worker_class = "uvicorn.workers.UvicornWorker"
+keepalive = settings.WEB_KEEPALIVE
+backlog = settings.WEB_BACKLOG
+timeout = settings.WEB_TIMEOUT
+graceful_timeout = settings.WEB_GRACEFUL_TIMEOUT
+preload_app = False
+accesslog = "-"
+
+# Workers write their metrics here so /metrics can merge them.
+os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR",
+    os.path.join(tempfile.gettempdir(), "knorozov-metrics")
+)
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+
+def on_starting(server):
+    metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+
+    # Values left over from a previous run would be merged in too.
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+
+    # In a child process, so the master never opens a MongoDB client
+    # that the forked workers would inherit.
+    subprocess.run(
+        [sys.executable, "setup_database.py"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        check=True
+    )
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
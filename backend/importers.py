@@ -0,0 +1,367 @@
+import csv
+import json
+from collections import Counter
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Set,
+    TextIO,
+    Tuple,
+    Union
+)
+from storage import TranslationStore
+from coverage import coverage
+from bundles import bundle_cache
+from cache import invalidate_pages
+from changelog import PAGE_ADDED, ENTRY_ADDED, TRANSLATION_SET, change_log
+
+# (page, key, lang, text), lang and text are None for entries that
+# only have to exist without carrying a translation, key as well for
+# pages without entries.
+Record = Tuple[str, Union[str, None], Union[str, None], Union[str, None]]
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def _page_records(page: Any) -> Iterator[Record]:
+    if not isinstance(page, dict) or "name" not in page:
+        raise ImportFormatError("Every page must be an object with a name.")
+
+    if not page.get("entries"):
+        yield page["name"], None, None, None
+
+    for entry in page.get("entries", []):
+        translations = entry.get("translations") or {}
+
+        if not translations:
+            yield page["name"], entry["key"], None, None
+
+        for lang, text in translations.items():
+            yield page["name"], entry["key"], lang, text
+
+
+def parse_json(
+    stream: TextIO,
+    chunk_size: int = 64 * 1024
+) -> Iterator[Record]:
+    """Reads the `GET /translations/pages` shape one page at a time.
+
+    Both a JSON array of pages and newline-delimited pages are accepted,
+    only a single page is held in memory at once.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    eof = False
+
+    while True:
+        buffer = buffer.lstrip(" \t\r\n,[]")
+
+        if not buffer:
+            if eof:
+                return
+
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+
+        try:
+            page, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError as e:
+            if eof:
+                raise ImportFormatError(f"Malformed JSON: {e}")
+
+            # The page is not complete yet, read at least as much again
+            # to keep re-parsing of long pages linear.
+            chunk = stream.read(max(chunk_size, len(buffer)))
+            eof = not chunk
+            buffer += chunk
+            continue
+
+        buffer = buffer[end:]
+
+        yield from _page_records(page)
+
+
+def parse_csv(stream: TextIO) -> Iterator[Record]:
+    """Reads `page,key,<lang>,<lang>...` rows, empty cells are skipped."""
+    reader = csv.reader(stream)
+    header = next(reader, None)
+
+    if not header or header[:2] != ["page", "key"]:
+        raise ImportFormatError("CSV header must start with 'page,key'.")
+
+    langs = header[2:]
+
+    for row in reader:
+        if not row:
+            continue
+
+        page, key, texts = row[0], row[1], row[2:]
+        translated = False
+
+        for lang, text in zip(langs, texts):
+            if text:
+                translated = True
+                yield page, key, lang, text
+
+        if not translated:
+            yield page, key, None, None
+
+
+_PO_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", '"': '"', "\\": "\\"}
+
+
+def _po_unquote(value: str) -> str:
+    value = value.strip()
+
+    if len(value) < 2 or value[0] != '"' or value[-1] != '"':
+        raise ImportFormatError(f"Malformed PO string: {value}")
+
+    result = []
+    chars = iter(value[1:-1])
+
+    for char in chars:
+        if char == "\\":
+            escaped = next(chars, "")
+            result.append(_PO_ESCAPES.get(escaped, escaped))
+        else:
+            result.append(char)
+
+    return "".join(result)
+
+
+def parse_po(
+    stream: TextIO,
+    lang: str,
+    default_page: Union[str, None] = None
+) -> Iterator[Record]:
+    """Reads a gettext catalog, msgctxt is the page and msgid the key.
+
+    Fuzzy entries only create the key, entries with plural forms are
+    skipped.
+    """
+    message: Dict[str, str] = {}
+    fuzzy = False
+    field: Union[str, None] = None
+
+    def complete() -> bool:
+        return "msgstr" in message or "msgid_plural" in message
+
+    def flush() -> Iterator[Record]:
+        msgid = message.get("msgid")
+        page = message.get("msgctxt", default_page)
+
+        if msgid and "msgid_plural" not in message:
+            if page is None:
+                raise ImportFormatError(
+                    f"Message '{msgid}' has no msgctxt and no page was given."
+                )
+
+            text = message.get("msgstr")
+
+            if text and not fuzzy:
+                yield page, msgid, lang, text
+            else:
+                yield page, msgid, None, None
+
+    for line in stream:
+        line = line.strip()
+
+        if not line or line.startswith("#"):
+            if complete():
+                yield from flush()
+                message, fuzzy = {}, False
+            elif not line:
+                # An entry without msgstr ends at the blank line as well.
+                message, fuzzy = {}, False
+
+            if line.startswith("#,") and "fuzzy" in line:
+                fuzzy = True
+
+            field = None
+            continue
+
+        if line.startswith('"'):
+            if field is not None:
+                message[field] += _po_unquote(line)
+            continue
+
+        keyword, _, value = line.partition(" ")
+
+        if keyword in ("msgctxt", "msgid") and complete():
+            yield from flush()
+            message, fuzzy = {}, False
+
+        if keyword in ("msgctxt", "msgid", "msgid_plural", "msgstr"):
+            message[keyword] = _po_unquote(value)
+            field = keyword
+        else:
+            field = None
+
+    if complete():
+        yield from flush()
+
+
+class TranslationImporter:
+    """Writes parsed records to the store in fixed-size batches.
+
+    Missing pages and entries are created. An existing translation that
+    differs from the imported one is a conflict and is kept unless
+    `overwrite` is set.
+    """
+
+    def __init__(
+        self,
+        store: TranslationStore,
+        languages: Set[str],
+        batch_size: int,
+        overwrite: bool = False
+    ) -> None:
+        self._store = store
+        self._languages = languages
+        self._batch_size = batch_size
+        self._overwrite = overwrite
+        self._totals = {
+            "processed": 0,
+            "pages_created": 0,
+            "entries_created": 0,
+            "translations_set": 0,
+            "unchanged": 0,
+            "skipped": 0,
+            "conflicts": 0
+        }
+
+    async def run(self, records: Iterable[Record]) -> AsyncIterator[dict]:
+        """Yields a progress report per batch and a final summary."""
+        batch: List[Record] = []
+
+        for record in records:
+            batch.append(record)
+
+            if len(batch) >= self._batch_size:
+                yield await self._import_batch(batch)
+                batch = []
+
+        if batch:
+            yield await self._import_batch(batch)
+
+        yield {"done": True, **self._totals}
+
+    async def _import_batch(self, batch: List[Record]) -> dict:
+        pages = dict.fromkeys(page for page, _, _, _ in batch)
+        pages_created = await self._store.add_pages(pages)
+
+        pairs = dict.fromkeys(
+            (page, key) for page, key, _, _ in batch if key is not None
+        )
+        current = await self._store.get_entries(set(pairs))
+        missing = [pair for pair in pairs if pair not in current]
+
+        if missing:
+            await self._store.add_entries(missing)
+
+        report: Dict[str, Any] = {
+            "pages_created": len(pages_created),
+            "entries_created": len(missing),
+            "translations_set": 0,
+            "unchanged": 0,
+            "skipped": 0,
+            "conflicts": []
+        }
+
+        # Later records for the same cell win, like they would one by one.
+        texts: Dict[Tuple[str, str, str], str] = {}
+
+        for page, key, lang, text in batch:
+            if lang is None:
+                continue
+
+            if lang not in self._languages or not isinstance(text, str):
+                report["skipped"] += 1
+                continue
+
+            texts[(page, key, lang)] = text
+
+        items = []
+
+        for (page, key, lang), text in texts.items():
+            existing = current.get((page, key), {}).get(lang)
+
+            if existing == text:
+                report["unchanged"] += 1
+            elif existing is not None and not self._overwrite:
+                report["conflicts"].append({
+                    "page": page,
+                    "key": key,
+                    "lang": lang,
+                    "current": existing,
+                    "imported": text
+                })
+            else:
+                items.append((page, key, lang, text))
+
+        statuses = await self._store.set_translations(items) if items else []
+
+        updated = []
+        created: Counter = Counter()
+
+        for item, item_status in zip(items, statuses):
+            if item_status in ("created", "updated"):
+                bundle_cache.set_translation(*item)
+                updated.append(item)
+            else:
+                report["skipped"] += 1
+
+            if item_status == "created":
+                created[(item[0], item[2])] += 1
+
+        report["translations_set"] = len(updated)
+
+        await coverage.add_pages(
+            page for page in pages if page in pages_created
+        )
+        await coverage.count(
+            Counter(page for page, _ in missing),
+            created
+        )
+
+        if pages_created or missing or updated:
+            await invalidate_pages(pages)
+
+        await change_log.record_many(
+            PAGE_ADDED,
+            [{"page": page} for page in pages if page in pages_created]
+        )
+        await change_log.record_many(
+            ENTRY_ADDED,
+            [{"page": page, "key": key} for page, key in missing]
+        )
+        await change_log.record_many(
+            TRANSLATION_SET,
+            [
+                {"page": page, "key": key, "lang": lang, "text": text}
+                for page, key, lang, text in updated
+            ]
+        )
+
+        self._totals["processed"] += len(batch)
+
+        for name in (
+            "pages_created",
+            "entries_created",
+            "translations_set",
+            "unchanged",
+            "skipped"
+        ):
+            self._totals[name] += report[name]
+
+        self._totals["conflicts"] += len(report["conflicts"])
+
+        return {"processed": self._totals["processed"], **report}
@@ -1,8 +1,28 @@
+import config
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from routes import users, translations
+from fastapi.responses import ORJSONResponse
+from routes import users, translations, service
 from fastapi.middleware.cors import CORSMiddleware
+from brotli_asgi import BrotliMiddleware
+from metrics import MetricsMiddleware
+from database import db_connection
+from setup_database import setup
+from utils import password_hasher
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if config.SETUP_DATABASE_ON_STARTUP:
+        await setup()
+
+    yield
+
+    password_hasher.shutdown()
+    db_connection.close()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 origins = ["*"]
 app.add_middleware(
     CORSMiddleware,
@@ -10,6 +30,19 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-After", "ETag"],
+)
+# Brotli when the client accepts it, gzip otherwise.
+app.add_middleware(
+    BrotliMiddleware,
+    quality=config.BROTLI_QUALITY,
+    minimum_size=config.COMPRESSION_MIN_SIZE,
+    gzip_fallback=True,
+    # Compressors buffer, events have to go out as they happen.
+    excluded_handlers=[r"^/translations/changes/stream$"]
 )
+app.add_middleware(MetricsMiddleware)
 app.include_router(users.router)
 app.include_router(translations.router)
+app.include_router(service.router)
+
@@ -0,0 +1,209 @@
+import os
+import threading
+import time
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess
+)
+from pymongo import monitoring
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time spent serving a request, until its body was sent.",
+    ["method", "route"]
+)
+HTTP_REQUESTS = Counter(
+    "http_requests_total",
+    "Requests served, by response status.",
+    ["method", "route", "status"]
+)
+MONGO_COMMAND_DURATION = Histogram(
+    "mongo_command_duration_seconds",
+    "Round trip time of MongoDB commands.",
+    ["command", "collection"],
+    buckets=(
+        .0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5
+    )
+)
+MONGO_COMMANDS = Counter(
+    "mongo_commands_total",
+    "MongoDB commands sent, by outcome.",
+    ["command", "collection", "outcome"]
+)
+MONGO_POOL_WAIT = Histogram(
+    "mongo_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled connection.",
+    buckets=(
+        .0001, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 5
+    )
+)
+MONGO_POOL_CHECKOUT_FAILURES = Counter(
+    "mongo_pool_checkout_failures_total",
+    "Connection checkouts that failed, by reason.",
+    ["reason"]
+)
+# Gauges are summed over the live workers when served by gunicorn.
+MONGO_POOL_IN_USE = Gauge(
+    "mongo_pool_connections_in_use",
+    "Connections checked out of the pool.",
+    ["address"],
+    multiprocess_mode="livesum"
+)
+MONGO_POOL_OPEN = Gauge(
+    "mongo_pool_connections_open",
+    "Connections held by the pool, idle or in use.",
+    ["address"],
+    multiprocess_mode="livesum"
+)
+PASSWORD_HASH_QUEUE = Gauge(
+    "password_hash_queue_depth",
+    "Password hashing calls waiting for a free worker.",
+    multiprocess_mode="livesum"
+)
+CHANGE_STREAM_SUBSCRIBERS = Gauge(
+    "change_stream_subscribers",
+    "Clients connected to the live change stream.",
+    multiprocess_mode="livesum"
+)
+
+
+def latest() -> bytes:
+    """Renders all metrics, merged over workers in multiprocess mode."""
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return generate_latest()
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+
+    return generate_latest(registry)
+
+
+class MetricsMiddleware:
+    """Times every HTTP request and counts it per route template."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched route in the shared scope.
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+
+            HTTP_REQUEST_DURATION.labels(scope["method"], path).observe(
+                time.perf_counter() - started
+            )
+            HTTP_REQUESTS.labels(
+                scope["method"],
+                path,
+                str(status_code)
+            ).inc()
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """Records the duration of every command by collection."""
+
+    def __init__(self) -> None:
+        self._collections: dict = {}
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        if event.command_name == "getMore":
+            collection = event.command.get("collection")
+        else:
+            collection = event.command.get(event.command_name)
+
+        self._collections[(event.connection_id, event.request_id)] = \
+            collection if isinstance(collection, str) else ""
+
+    def _finished(self, event, outcome: str) -> None:
+        collection = self._collections.pop(
+            (event.connection_id, event.request_id),
+            ""
+        )
+
+        MONGO_COMMAND_DURATION.labels(
+            event.command_name,
+            collection
+        ).observe(event.duration_micros / 1e6)
+        MONGO_COMMANDS.labels(event.command_name, collection, outcome).inc()
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._finished(event, "succeeded")
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._finished(event, "failed")
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Measures checkout waits and pool usage.
+
+    A checkout starts and ends on the same thread, so the start time is
+    kept thread-local.
+    """
+
+    def __init__(self) -> None:
+        self._local = threading.local()
+
+    @staticmethod
+    def _address(event) -> str:
+        return "%s:%s" % event.address
+
+    def connection_check_out_started(self, event) -> None:
+        self._local.started = time.perf_counter()
+
+    def connection_checked_out(self, event) -> None:
+        started = getattr(self._local, "started", None)
+
+        if started is not None:
+            MONGO_POOL_WAIT.observe(time.perf_counter() - started)
+
+        MONGO_POOL_IN_USE.labels(self._address(event)).inc()
+
+    def connection_check_out_failed(self, event) -> None:
+        MONGO_POOL_CHECKOUT_FAILURES.labels(event.reason).inc()
+
+    def connection_checked_in(self, event) -> None:
+        MONGO_POOL_IN_USE.labels(self._address(event)).dec()
+
+    def connection_created(self, event) -> None:
+        MONGO_POOL_OPEN.labels(self._address(event)).inc()
+
+    def connection_closed(self, event) -> None:
+        MONGO_POOL_OPEN.labels(self._address(event)).dec()
+
+    def pool_created(self, event) -> None:
+        pass
+
+    def pool_ready(self, event) -> None:
+        pass
+
+    def pool_cleared(self, event) -> None:
+        pass
+
+    def pool_closed(self, event) -> None:
+        pass
+
+    def connection_ready(self, event) -> None:
+        pass
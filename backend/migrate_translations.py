@@ -0,0 +1,71 @@
+"""Copies translation pages from the embedded layout to the normalized one.
+
+Usage:
+    python migrate_translations.py [--batch-size N] [--drop-source]
+
+The migration is idempotent: pages and entries are upserted, so it can be
+re-run after an interruption. Set TRANSLATIONS_LAYOUT=normalized once it
+has finished.
+"""
+import argparse
+import asyncio
+import pymongo
+from pymongo import UpdateOne
+from database import INDEXES, db_connection, db_translations
+
+
+async def migrate(batch_size: int, drop_source: bool) -> None:
+    pages = db_connection.getCollection("translation_pages")
+    entries = db_connection.getCollection("translation_entries")
+
+    await db_connection.ensure_indexes({
+        name: INDEXES[name]
+        for name in ("translation_pages", "translation_entries")
+    })
+
+    pages_count = 0
+    entries_count = 0
+    batch = []
+
+    async def flush():
+        if batch:
+            await entries.bulk_write(batch, ordered=True)
+            batch.clear()
+
+    async for page in db_translations.find().sort("_id", pymongo.ASCENDING):
+        await pages.update_one(
+            {"name": page["name"]},
+            {"$setOnInsert": {"_id": page["_id"]}},
+            upsert=True
+        )
+        pages_count += 1
+
+        for entry in page.get("entries", []):
+            batch.append(UpdateOne(
+                {"page": page["name"], "key": entry["key"]},
+                {"$set": {"translations": entry.get("translations", {})}},
+                upsert=True
+            ))
+            entries_count += 1
+
+            if len(batch) >= batch_size:
+                await flush()
+
+    await flush()
+
+    print(f"Migrated {pages_count} pages and {entries_count} entries.")
+
+    if drop_source:
+        await db_translations.drop()
+        print("Dropped the embedded 'translations' collection.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Migrate translations to the normalized layout."
+    )
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--drop-source", action="store_true")
+    args = parser.parse_args()
+
+    asyncio.run(migrate(args.batch_size, args.drop_source))
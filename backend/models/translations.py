@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Union
 
 
 class TranslationEntry(BaseModel):
@@ -18,7 +18,23 @@ class TranslationPage(BaseModel):
 class Language(BaseModel):
     code: str
     name: str
+    # Languages whose texts fill the gaps in bundles, in order.
+    fallbacks: List[str] = []
 
 
 class LanguageUpdate(BaseModel):
     name: str
+    # Left as is when omitted.
+    fallbacks: Union[List[str], None] = None
+
+
+class TranslationItem(BaseModel):
+    page: str
+    key: str
+    lang: str
+    text: str
+
+
+class TranslationBatch(BaseModel):
+    items: List[TranslationItem]
+    ordered: bool = False
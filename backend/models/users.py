@@ -21,6 +21,17 @@ class RolesUpdate(BaseModel):
     codes: List[str]
 
 
+class RolesItem(BaseModel):
+    login: str
+    # One of 'set', 'add' or 'delete'.
+    action: str = "set"
+    codes: List[str]
+
+
+class RolesBatch(BaseModel):
+    items: List[RolesItem]
+
+
 class Tokens(BaseModel):
     refresh_token: str
     access_token: str
@@ -0,0 +1,43 @@
+from fastapi import APIRouter, Response, status
+from prometheus_client import CONTENT_TYPE_LATEST
+from cache import cache_stats
+from utils import password_hasher
+from metrics import latest
+
+
+router = APIRouter()
+
+tag = 'Service methods'
+
+
+@router.get(
+    "/cache/stats",
+    status_code=status.HTTP_200_OK,
+    summary='Returns hit and miss counters of the server caches.',
+    tags=[tag]
+)
+async def get_cache_stats():
+
+    return cache_stats()
+
+
+@router.get(
+    "/password_hasher/stats",
+    status_code=status.HTTP_200_OK,
+    summary='Returns the load of the password hashing pool.',
+    tags=[tag]
+)
+async def get_password_hasher_stats():
+
+    return password_hasher.stats()
+
+
+@router.get(
+    "/metrics",
+    status_code=status.HTTP_200_OK,
+    summary='Exposes the server metrics in the Prometheus text format.',
+    tags=[tag]
+)
+async def get_metrics():
+
+    return Response(latest(), media_type=CONTENT_TYPE_LATEST)
@@ -1,19 +1,81 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+import io
+import json
+import orjson
+from collections import Counter
+from typing import List, Union
+from fastapi import (
+    APIRouter,
+    HTTPException,
+    status,
+    Depends,
+    Query,
+    Request,
+    Response
+)
+from fastapi.responses import StreamingResponse
+from starlette.datastructures import UploadFile
 from models.users import User
 from models.translations import (
     Language,
     LanguageUpdate,
     TranslationPage,
     TranslationEntry,
-    Translation
+    Translation,
+    TranslationBatch
+)
+from database import db_languages
+from storage import translation_store
+from bundles import BUNDLE_FORMATS, bundle_cache
+from cache import (
+    MISSING,
+    cache_invalidator,
+    languages_cache,
+    pages_cache,
+    page_lists_cache,
+    invalidate_languages,
+    invalidate_page,
+    invalidate_pages
 )
-from database import db_languages, db_translations
 from schemas import (
     LanguageSerializer,
-    TranslationPageSerializer
+    TranslationPageSerializer,
+    TranslationPageNameSerializer
+)
+from importers import (
+    ImportFormatError,
+    TranslationImporter,
+    parse_csv,
+    parse_json,
+    parse_po
 )
+from changelog import (
+    LANGUAGE_ADDED,
+    LANGUAGE_UPDATED,
+    LANGUAGE_REMOVED,
+    PAGE_ADDED,
+    PAGE_DELETED,
+    ENTRY_ADDED,
+    ENTRY_DELETED,
+    TRANSLATION_SET,
+    ChangeLogExpired,
+    change_log
+)
+from feed import change_feed
+from search import search_index
+from coverage import coverage
 from deps import get_current_user
+from utils import (
+    conditional_response,
+    next_cursor,
+    parse_cursor,
+    parse_cursor_fields,
+    represent,
+    set_next_cursor
+)
+import config
 import pymongo
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
 router = APIRouter(prefix='/translations')
 
@@ -21,24 +83,95 @@ tag_lang = 'Working with languages'
 tag_translate = 'Working with translations'
 
 
+def cached_page(page_name: str) -> dict:
+    """Returns the cached representations of a page and its entries.
+
+    The whole page is kept under None and single translations under
+    (key, lang), so dropping the page from the cache drops them all.
+    """
+    representations = pages_cache.get(page_name)
+
+    if representations is MISSING:
+        representations = {}
+        pages_cache.set(page_name, representations)
+
+    return representations
+
+
+async def check_fallbacks(code: str, fallbacks: List[str]) -> List[str]:
+    """Returns the fallback chain without duplicates, 400 if it's invalid."""
+    fallbacks = list(dict.fromkeys(fallbacks))
+
+    if code in fallbacks:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="A language can't fall back to itself."
+        )
+
+    if not fallbacks:
+        return fallbacks
+
+    existing = set(await db_languages.distinct(
+        "code",
+        {"code": {"$in": fallbacks}}
+    ))
+
+    for fallback in fallbacks:
+        if fallback not in existing:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"There's no such a language with code '{fallback}' "
+                       "yet."
+            )
+
+    return fallbacks
+
+
+async def raise_entry_error(
+    page_name: str,
+    detail: str = "Translation entry doesn't exist."
+):
+    if not await translation_store.page_exists(page_name):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Translation page doesn't exist."
+        )
+
+    raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=detail
+    )
+
+
 @router.get(
     "/languages",
     status_code=status.HTTP_200_OK,
     summary='Returns the list of all languages.',
     tags=[tag_lang]
 )
-async def get_languages():
-
-    language = LanguageSerializer.list_serialize(
-        db_languages.find().sort(
-            [
-                ("code", pymongo.ASCENDING),
-                ("language", pymongo.ASCENDING)
-            ]
+async def get_languages(request: Request):
+
+    await cache_invalidator.sync()
+    languages = languages_cache.get(("all",))
+
+    if languages is MISSING:
+        # Not cached if a write lands while reading.
+        generation = languages_cache.generation
+        languages = represent(
+            LanguageSerializer.list_render(
+                await db_languages.find().sort(
+                    [
+                        ("code", pymongo.ASCENDING),
+                        ("language", pymongo.ASCENDING)
+                    ]
+                ).to_list(length=None)
+            ),
+            ("languages",),
+            cache_invalidator.modified_at("languages")
         )
-    )
+        languages_cache.set(("all",), languages, generation)
 
-    return language
+    return conditional_response(request, languages)
 
 
 @router.get(
@@ -47,11 +180,23 @@ async def get_languages():
     summary='Gets language by its code.',
     tags=[tag_lang]
 )
-async def get_language(code: str):
+async def get_language(code: str, request: Request):
 
-    language = LanguageSerializer.serialize(
-        db_languages.find_one({"code": code})
-    )
+    await cache_invalidator.sync()
+    language = languages_cache.get(("code", code))
+
+    if language is MISSING:
+        generation = languages_cache.generation
+        language = await db_languages.find_one({"code": code})
+
+        if language is not None:
+            language = represent(
+                LanguageSerializer.render(language),
+                ("language", code),
+                cache_invalidator.modified_at("languages")
+            )
+
+        languages_cache.set(("code", code), language, generation)
 
     if language is None:
         raise HTTPException(
@@ -59,7 +204,7 @@ async def get_language(code: str):
             detail="Language doesn't exist."
         )
 
-    return language
+    return conditional_response(request, language)
 
 
 @router.post(
@@ -76,17 +221,27 @@ async def add_language(lang: Language, user: User = Depends(get_current_user)):
             detail="Admin rights are required."
         )
 
-    language = LanguageSerializer.serialize(
-        db_languages.find_one({"code": lang.code})
-    )
+    fallbacks = await check_fallbacks(lang.code, lang.fallbacks)
 
-    if language is not None:
+    try:
+        await db_languages.insert_one(dict(Language(
+            code=lang.code,
+            name=lang.name,
+            fallbacks=fallbacks
+        )))
+    except DuplicateKeyError:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Language already exists."
         )
 
-    db_languages.insert_one(dict(Language(code=lang.code, name=lang.name)))
+    await invalidate_languages()
+    await change_log.record(
+        LANGUAGE_ADDED,
+        code=lang.code,
+        name=lang.name,
+        fallbacks=fallbacks
+    )
 
     return {"message": "Language was added!"}
 
@@ -109,8 +264,16 @@ async def update_language(
             detail="Admin rights are required."
         )
 
-    language = LanguageSerializer.serialize(
-        db_languages.find_one({"code": code})
+    changes = {"name": update.name}
+
+    if update.fallbacks is not None:
+        changes["fallbacks"] = await check_fallbacks(code, update.fallbacks)
+
+    language = await db_languages.find_one_and_update(
+        {"code": code},
+        {"$set": changes},
+        {"_id": 0, "name": 1, "fallbacks": 1},
+        return_document=ReturnDocument.AFTER
     )
 
     if language is None:
@@ -119,7 +282,16 @@ async def update_language(
             detail="Language doesn't exist."
         )
 
-    db_languages.update_one({"code": code}, {"$set": {"name": update.name}})
+    if update.fallbacks is not None:
+        bundle_cache.invalidate(code)
+
+    await invalidate_languages()
+    await change_log.record(
+        LANGUAGE_UPDATED,
+        code=code,
+        name=language["name"],
+        fallbacks=language.get("fallbacks", [])
+    )
 
     return {"message": "Language was updated!"}
 
@@ -138,17 +310,37 @@ async def remove_language(code: str, user: User = Depends(get_current_user)):
             detail="Admin rights are required."
         )
 
-    language = LanguageSerializer.serialize(
-        db_languages.find_one({"code": code})
-    )
+    result = await db_languages.delete_one({"code": code})
 
-    if language is None:
+    if result.deleted_count == 0:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Language doesn't exist."
         )
 
-    db_languages.delete_one({"code": code})
+    # Other chains just skip the removed language from now on. One
+    # language at a time, so each recorded chain is the one written.
+    updated = []
+
+    while True:
+        language = await db_languages.find_one_and_update(
+            {"fallbacks": code},
+            {"$pull": {"fallbacks": code}},
+            {"_id": 0, "code": 1, "name": 1, "fallbacks": 1},
+            return_document=ReturnDocument.AFTER
+        )
+
+        if language is None:
+            break
+
+        updated.append(language)
+
+    bundle_cache.invalidate(code)
+    await invalidate_languages()
+    await change_log.record(LANGUAGE_REMOVED, code=code)
+
+    if updated:
+        await change_log.record_many(LANGUAGE_UPDATED, updated)
 
     return {"message": "Language was removed!"}
 
@@ -159,17 +351,44 @@ async def remove_language(code: str, user: User = Depends(get_current_user)):
     summary='Returns the list of all translation pages.',
     tags=[tag_translate]
 )
-async def get_pages():
+async def get_pages(
+    request: Request,
+    limit: Union[int, None] = Query(None, ge=1),
+    after: Union[str, None] = None,
+    names_only: bool = False
+):
+
+    after = parse_cursor(after)
+    await cache_invalidator.sync()
+    cached = page_lists_cache.get((after, limit, names_only))
 
-    pages = TranslationPageSerializer.list_serialize(
-        db_translations.find().sort(
-            [
-                ("page_name", pymongo.ASCENDING)
-            ]
+    # The rendered body is cached, a hit costs no serialization at all.
+    if cached is MISSING:
+        generation = page_lists_cache.generation
+        serializer = (
+            TranslationPageNameSerializer if names_only
+            else TranslationPageSerializer
         )
-    )
+        pages = serializer.list_serialize(
+            await translation_store.list_pages(after, limit, names_only)
+        )
+        cached = (
+            represent(
+                orjson.dumps(pages),
+                ("pages", after, limit, names_only),
+                cache_invalidator.modified_at("pages")
+            ),
+            next_cursor(pages, limit, "name")
+        )
+        page_lists_cache.set((after, limit, names_only), cached, generation)
+
+    pages, cursor = cached
 
-    return pages
+    return conditional_response(
+        request,
+        pages,
+        {"X-Next-After": cursor} if cursor is not None else None
+    )
 
 
 @router.get(
@@ -178,13 +397,23 @@ async def get_pages():
     summary='Returns a translation page by its name.',
     tags=[tag_translate]
 )
-async def get_page(page_name: str):
+async def get_page(page_name: str, request: Request):
 
-    page = TranslationPageSerializer.serialize(
-        db_translations.find_one({"name": page_name})
-    )
+    await cache_invalidator.sync()
+    representations = cached_page(page_name)
+    page = representations.get(None)
+
+    if page is None:
+        page = represent(
+            TranslationPageSerializer.render(
+                await translation_store.get_page(page_name)
+            ),
+            ("page", page_name),
+            cache_invalidator.modified_at("pages")
+        )
+        representations[None] = page
 
-    return page
+    return conditional_response(request, page)
 
 
 @router.post(
@@ -204,19 +433,15 @@ async def add_page(
             detail="Admin rights are required."
         )
 
-    same_page = TranslationPageSerializer.serialize(
-        db_translations.find_one({"name": page.name})
-    )
-
-    if same_page is not None:
+    if not await translation_store.add_page(page.name):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Translation page already exists."
         )
 
-    db_translations.insert_one(
-        dict(TranslationPage(name=page.name, entries=[]))
-    )
+    await coverage.add_pages([page.name])
+    await invalidate_page(page.name)
+    await change_log.record(PAGE_ADDED, page=page.name)
 
     return {"message": "Translation page was added!"}
 
@@ -235,17 +460,16 @@ async def delete_page(page_name: str, user: User = Depends(get_current_user)):
             detail="Admin rights are required."
         )
 
-    page = TranslationPageSerializer.serialize(
-        db_translations.find_one({"name": page_name})
-    )
-
-    if page is None:
+    if not await translation_store.delete_page(page_name):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Translation page doesn't exists."
         )
 
-    db_translations.delete_one({"name": page_name})
+    await coverage.delete_page(page_name)
+    bundle_cache.delete_page(page_name)
+    await invalidate_page(page_name)
+    await change_log.record(PAGE_DELETED, page=page_name)
 
     return {"message": "Translation page was deleted!"}
 
@@ -268,29 +492,15 @@ async def add_translation_entry(
             detail="Admin rights are required."
         )
 
-    page = TranslationPageSerializer.serialize(
-        db_translations.find_one({"name": page_name})
-    )
-
-    entries_keys = [e['key'] for e in page['entries']] if page else []
-
-    if entry.key in entries_keys:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Translation entry already exists."
+    if not await translation_store.add_entry(page_name, entry.key):
+        await raise_entry_error(
+            page_name,
+            "Translation entry already exists."
         )
 
-    db_translations.update_one(
-        {"name": page_name},
-        {
-            "$addToSet": {
-                'entries': {
-                    "key": entry.key,
-                    "translations": {}
-                }
-            }
-        }
-    )
+    await coverage.count({page_name: 1})
+    await invalidate_page(page_name)
+    await change_log.record(ENTRY_ADDED, page=page_name, key=entry.key)
 
     return {"message": "Translation entry was added!"}
 
@@ -313,28 +523,15 @@ async def del_translation_entry(
             detail="Admin rights are required."
         )
 
-    page = TranslationPageSerializer.serialize(
-        db_translations.find_one({"name": page_name})
-    )
-
-    if page is None:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Translation page doesn't exist."
-        )
-
-    entries_keys = [e['key'] for e in page['entries']] if page else []
+    translations = await translation_store.delete_entry(page_name, entry_key)
 
-    if entry_key not in entries_keys:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Translation entry doesn't exist."
-        )
+    if translations is None:
+        await raise_entry_error(page_name)
 
-    db_translations.update_one(
-        {"name": page_name},
-        {"$pull": {'entries': {"key": entry_key}}}
-    )
+    await coverage.entry_deleted(page_name, translations)
+    bundle_cache.delete_entry(page_name, entry_key)
+    await invalidate_page(page_name)
+    await change_log.record(ENTRY_DELETED, page=page_name, key=entry_key)
 
     return {"message": "Translation entry was deleted!"}
 
@@ -348,36 +545,30 @@ async def del_translation_entry(
 async def get_translation_entry_lang(
     page_name: str,
     entry_key: str,
-    lang: str
+    lang: str,
+    request: Request
 ):
 
-    page = TranslationPageSerializer.serialize(
-        db_translations.find_one({"name": page_name})
-    )
+    await cache_invalidator.sync()
+    representations = cached_page(page_name)
+    translation = representations.get((entry_key, lang))
 
-    if page is None:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Translation page doesn't exist."
-        )
+    if translation is None:
+        entry = await translation_store.get_entry(page_name, entry_key)
 
-    entries_keys = [e['key'] for e in page['entries']] if page else []
+        if entry is None:
+            await raise_entry_error(page_name)
 
-    if entry_key not in entries_keys:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Translation entry doesn't exist."
-        )
-        
-    entry = {'translations': {}}
-    
-    for cur_entry in page['entries']:
-        if cur_entry['key'] == entry_key:
-            entry = cur_entry
-            break
-    
-        
-    return { "translation": entry['translations'].get(lang, 'undefined')}
+        translation = represent(
+            orjson.dumps(
+                {"translation": entry['translations'].get(lang, 'undefined')}
+            ),
+            ("entry", page_name, entry_key, lang),
+            cache_invalidator.modified_at("pages")
+        )
+        representations[(entry_key, lang)] = translation
+
+    return conditional_response(request, translation)
 
 
 @router.put(
@@ -394,41 +585,456 @@ async def set_translation_entry_lang(
     user: User = Depends(get_current_user)
 ):
 
-    print(user.roles, lang)
     if (lang not in user.roles) and ("admin" not in user.roles):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You have no rights for this language."
         )
 
-    page = TranslationPageSerializer.serialize(
-        db_translations.find_one({"name": page_name})
+    previous = await translation_store.set_translation(
+        page_name,
+        entry_key,
+        lang,
+        translation.text
     )
 
-    if page is None:
+    if previous is None:
+        await raise_entry_error(page_name)
+
+    if lang not in previous:
+        await coverage.count(translations={(page_name, lang): 1})
+
+    bundle_cache.set_translation(
+        page_name,
+        entry_key,
+        lang,
+        translation.text
+    )
+    await invalidate_page(page_name)
+    await change_log.record(
+        TRANSLATION_SET,
+        page=page_name,
+        key=entry_key,
+        lang=lang,
+        text=translation.text
+    )
+
+    return {"message": "Translation entry lang was set!"}
+
+
+@router.put(
+    "/batch/set",
+    status_code=status.HTTP_200_OK,
+    summary='Sets many translations at once.',
+    tags=[tag_translate]
+)
+async def set_translations_batch(
+    batch: TranslationBatch,
+    user: User = Depends(get_current_user)
+):
+
+    if len(batch.items) > config.BATCH_MAX_ITEMS:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Translation page doesn't exist."
+            detail=f"Batch can't contain more than {config.BATCH_MAX_ITEMS} "
+                   "items."
         )
 
-    entries_keys = [e['key'] for e in page['entries']] if page else []
+    allowed = {
+        lang for lang in {item.lang for item in batch.items}
+        if lang in user.roles or "admin" in user.roles
+    }
+
+    results = [
+        {
+            "page": item.page,
+            "key": item.key,
+            "lang": item.lang,
+            "status": "updated" if item.lang in allowed else "forbidden"
+        }
+        for item in batch.items
+    ]
+
+    permitted = [
+        i for i, item in enumerate(batch.items) if item.lang in allowed
+    ]
+
+    statuses = await translation_store.set_translations(
+        [
+            (
+                batch.items[i].page,
+                batch.items[i].key,
+                batch.items[i].lang,
+                batch.items[i].text
+            )
+            for i in permitted
+        ],
+        batch.ordered
+    ) if permitted else []
+
+    updated = []
+    created: Counter = Counter()
+
+    for i, item_status in zip(permitted, statuses):
+        results[i]["status"] = item_status
+
+        if item_status in ("created", "updated"):
+            item = batch.items[i]
+            bundle_cache.set_translation(
+                item.page,
+                item.key,
+                item.lang,
+                item.text
+            )
+            updated.append(dict(item))
+
+            if item_status == "created":
+                created[(item.page, item.lang)] += 1
+
+    await coverage.count(translations=created)
+
+    if updated:
+        await invalidate_pages({item["page"] for item in updated})
+        await change_log.record_many(TRANSLATION_SET, updated)
+
+    return results
+
+
+async def stream_import(form, records, importer: TranslationImporter):
+    try:
+        async for report in importer.run(records):
+            yield json.dumps(report, ensure_ascii=False) + "\n"
+    except (ImportFormatError, ValueError, KeyError, TypeError) as e:
+        yield json.dumps({"error": str(e)}, ensure_ascii=False) + "\n"
+    finally:
+        await form.close()
+
 
-    if entry_key not in entries_keys:
+@router.post(
+    "/import",
+    status_code=status.HTTP_200_OK,
+    summary='Imports translations from a JSON, CSV or gettext .po file.',
+    tags=[tag_translate],
+    openapi_extra={
+        "requestBody": {
+            "content": {
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "properties": {
+                            "file": {"type": "string", "format": "binary"}
+                        },
+                        "required": ["file"]
+                    }
+                }
+            }
+        }
+    }
+)
+async def import_translations(
+    request: Request,
+    format: str = "json",
+    lang: Union[str, None] = None,
+    page: Union[str, None] = None,
+    overwrite: bool = False,
+    user: User = Depends(get_current_user)
+):
+
+    if "admin" not in user.roles:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin rights are required."
+        )
+
+    if format not in ("json", "csv", "po"):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Translation entry doesn't exist."
+            detail="Format must be one of 'json', 'csv' or 'po'."
         )
 
-    db_translations.update_one(
-        {
-            "name": page_name,
-            "entries.key": entry_key
-        },
-        {
-            "$set": {
-                f'entries.$.translations.{lang}': translation.text
-            }
+    if format == "po" and lang is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Language is required to import a .po file."
+        )
+
+    # The form is parsed here rather than by FastAPI so the spooled
+    # upload stays open while the response is being streamed.
+    form = await request.form()
+    upload = form.get("file")
+
+    if not isinstance(upload, UploadFile):
+        await form.close()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="File is required."
+        )
+
+    stream = io.TextIOWrapper(upload.file, encoding="utf-8", newline="")
+
+    if format == "json":
+        records = parse_json(stream)
+    elif format == "csv":
+        records = parse_csv(stream)
+    else:
+        records = parse_po(stream, lang, page)
+
+    importer = TranslationImporter(
+        translation_store,
+        set(await db_languages.distinct("code")),
+        config.IMPORT_BATCH_SIZE,
+        overwrite
+    )
+
+    return StreamingResponse(
+        stream_import(form, records, importer),
+        media_type="application/x-ndjson"
+    )
+
+
+async def stream_export(pages, format: str):
+    if format == "json":
+        yield b"["
+
+    first = True
+
+    async for page in pages:
+        body = TranslationPageSerializer.render(page)
+
+        if format == "json":
+            yield body if first else b"," + body
+        else:
+            yield body + b"\n"
+
+        first = False
+
+    if format == "json":
+        yield b"]"
+
+
+@router.get(
+    "/export",
+    status_code=status.HTTP_200_OK,
+    summary='Streams the whole translation database as JSON or NDJSON.',
+    tags=[tag_translate]
+)
+async def export_translations(
+    format: str = "json",
+    pages: Union[List[str], None] = Query(None),
+    langs: Union[List[str], None] = Query(None)
+):
+
+    if format not in ("json", "ndjson"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Format must be either 'json' or 'ndjson'."
+        )
+
+    return StreamingResponse(
+        stream_export(
+            translation_store.iter_pages(
+                pages,
+                langs,
+                config.EXPORT_BATCH_SIZE
+            ),
+            format
+        ),
+        media_type=(
+            "application/json" if format == "json"
+            else "application/x-ndjson"
+        ),
+        headers={
+            "Content-Disposition":
+                f'attachment; filename="translation.{format}"'
         }
     )
 
-    return {"message": "Translation entry lang was set!"}
+
+@router.get(
+    "/bundles/{lang}",
+    status_code=status.HTTP_200_OK,
+    summary='Returns all translations of a language as a "page.key" map '
+            'in JSON, msgpack or gettext .mo format.',
+    tags=[tag_translate]
+)
+async def get_bundle(
+    lang: str,
+    request: Request,
+    format: Union[str, None] = None
+):
+
+    if format is None:
+        accept = request.headers.get("accept", "")
+        format = next(
+            (
+                name for name, (_, media_type) in BUNDLE_FORMATS.items()
+                if media_type in accept
+            ),
+            "json"
+        )
+
+    if format not in BUNDLE_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Format must be one of " +
+                   ", ".join(f"'{name}'" for name in BUNDLE_FORMATS) + "."
+        )
+
+    await cache_invalidator.sync()
+    bundle = await bundle_cache.get(lang, format)
+
+    if bundle is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Language doesn't exist."
+        )
+
+    return Response(
+        content=bundle,
+        media_type=BUNDLE_FORMATS[format][1],
+        headers={"Vary": "Accept"}
+    )
+
+
+@router.get(
+    "/changes",
+    status_code=status.HTTP_200_OK,
+    summary='Returns what changed after the given revision.',
+    tags=[tag_translate]
+)
+async def get_changes(since: Union[int, None] = Query(None, ge=0)):
+
+    if since is None:
+        return {"revision": await change_log.revision()}
+
+    try:
+        return await change_log.since(since, config.CHANGES_BATCH_SIZE)
+    except ChangeLogExpired:
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="Revision is too old, download the full catalog."
+        )
+
+
+@router.get(
+    "/changes/stream",
+    status_code=status.HTTP_200_OK,
+    summary='Streams changes as server-sent events, optionally filtered '
+            'by page and language.',
+    tags=[tag_translate]
+)
+async def stream_changes(
+    request: Request,
+    since: Union[int, None] = Query(None, ge=0),
+    pages: Union[List[str], None] = Query(None),
+    langs: Union[List[str], None] = Query(None)
+):
+
+    # Browsers resume from the last event id on their own.
+    last_event_id = request.headers.get("last-event-id")
+
+    if last_event_id is not None:
+        try:
+            since = int(last_event_id)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Last-Event-ID must be a revision."
+            )
+
+    return StreamingResponse(
+        change_feed.stream(pages, langs, since),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get(
+    "/search",
+    status_code=status.HTTP_200_OK,
+    summary='Searches translation keys and texts.',
+    tags=[tag_translate]
+)
+async def search_translations(
+    response: Response,
+    q: str = Query(..., min_length=1),
+    langs: Union[List[str], None] = Query(None),
+    pages: Union[List[str], None] = Query(None),
+    scope: str = "all",
+    prefix: bool = False,
+    limit: int = Query(50, ge=1, le=1000),
+    after: Union[str, None] = None
+):
+
+    if not search_index.enabled:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Search is disabled, SEARCH_LANGUAGES is not set."
+        )
+
+    if scope not in ("all", "keys", "texts"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Scope must be one of 'all', 'keys' or 'texts'."
+        )
+
+    results = await search_index.search(
+        q,
+        langs,
+        pages,
+        in_keys=scope != "texts",
+        in_texts=scope != "keys",
+        prefix=prefix,
+        after=parse_cursor_fields(after, 2),
+        limit=limit
+    )
+
+    set_next_cursor(response, results, limit, "page", "key")
+
+    return results
+
+
+@router.get(
+    "/coverage",
+    status_code=status.HTTP_200_OK,
+    summary='Returns translated and missing entry counts per page '
+            'and language.',
+    tags=[tag_translate]
+)
+async def get_coverage(
+    response: Response,
+    langs: Union[List[str], None] = Query(None),
+    pages: Union[List[str], None] = Query(None),
+    limit: Union[int, None] = Query(None, ge=1),
+    after: Union[str, None] = None
+):
+
+    after = parse_cursor(after)
+
+    if langs is None:
+        langs = await db_languages.distinct("code")
+
+    report = await coverage.report(sorted(langs), pages, after, limit)
+    set_next_cursor(response, report, limit, "page")
+
+    return report
+
+
+@router.get(
+    "/coverage/{page_name}/{lang}/missing",
+    status_code=status.HTTP_200_OK,
+    summary='Returns the keys of a page that have no translation '
+            'to the language.',
+    tags=[tag_translate]
+)
+async def get_missing_keys(page_name: str, lang: str):
+
+    keys = await coverage.missing_keys(page_name, lang)
+
+    if keys is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Translation page doesn't exists."
+        )
+
+    return {"page": page_name, "lang": lang, "missing": keys}
@@ -1,11 +1,29 @@
 import config
-from fastapi import APIRouter, HTTPException, status, Depends
+import pymongo
+from typing import Any, Dict, Iterable, List, Set, Union
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Response
 from fastapi.security import OAuth2PasswordRequestForm
-from models.users import User, UserAuth, Tokens, UserUpdate, RolesUpdate
-from schemas import UserSerializer, SafeUserSerializer, LanguageSerializer
-from database import db_users, db_languages
-from utils import hash_password, verify_hash, create_jwt_token
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+from models.users import (
+    User,
+    UserAuth,
+    Tokens,
+    UserUpdate,
+    RolesUpdate,
+    RolesBatch
+)
+from schemas import UserSerializer, SafeUserSerializer
+from database import db_users, db_languages, db_settings
+from utils import (
+    hash_password,
+    password_hasher,
+    create_jwt_token,
+    parse_cursor,
+    set_next_cursor
+)
 from deps import get_current_user
+from cache import invalidate_user, invalidate_users
 
 
 router = APIRouter(prefix='/users')
@@ -13,6 +31,64 @@ router = APIRouter(prefix='/users')
 tag = 'User manipulation methods'
 
 
+async def raise_user_error(login: str, detail: str):
+    if await db_users.find_one({"login": login}, {"_id": 1}) is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="User doesn't exist."
+        )
+
+    raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=detail
+    )
+
+
+async def existing_codes(codes: Iterable[str]) -> Set[str]:
+    codes = list(set(codes))
+
+    if not codes:
+        return set()
+
+    return set(await db_languages.distinct("code", {"code": {"$in": codes}}))
+
+
+async def check_language_codes(codes: List[str]) -> None:
+    existing = await existing_codes(codes)
+
+    for code in codes:
+        if code not in existing:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"There's no such a language with code '{code}' yet."
+            )
+
+
+def roles_update(action: str, codes: List[str]) -> Dict[str, Any]:
+    if action == "set":
+        return {"$set": {"roles": list(set(codes))}}
+
+    if action == "add":
+        return {"$addToSet": {"roles": {"$each": codes}}}
+
+    return {"$pullAll": {"roles": codes}}
+
+
+async def update_roles(
+    login: str,
+    update: Dict[str, Any],
+    admin_detail: str
+) -> None:
+    """Applies `update` to the roles of a user that isn't an admin."""
+    result = await db_users.update_one(
+        {"login": login, "roles": {"$ne": "admin"}},
+        update
+    )
+
+    if result.matched_count == 0:
+        await raise_user_error(login, admin_detail)
+
+
 @router.post(
     "/login",
     status_code=status.HTTP_200_OK,
@@ -24,7 +100,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     login = form_data.username
 
     check_users = UserSerializer.list_serialize(
-        db_users.find({"login": login})
+        await db_users.find({"login": login}).to_list(length=None)
     )
 
     if not len(check_users):
@@ -36,12 +112,23 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     password = form_data.password
     user = check_users[0]
 
-    if not verify_hash(password, user["password_hash"]):
+    verified, new_hash = await password_hasher.verify_and_update(
+        password,
+        user["password_hash"]
+    )
+
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Wrong password or user doesn't exists."
         )
 
+    if new_hash is not None:
+        await db_users.update_one(
+            {"login": login},
+            {"$set": {"password_hash": new_hash}}
+        )
+
     return dict(Tokens(
         refresh_token=create_jwt_token(
             login,
@@ -56,6 +143,24 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     ))
 
 
+async def claim_admin(login: str) -> bool:
+    """Makes `login` the first admin, only one signup can win the claim."""
+    if await db_users.find_one({}, {"_id": 1}) is not None:
+        return False
+
+    try:
+        await db_settings.insert_one({"_id": "first_admin", "login": login})
+    except DuplicateKeyError:
+        return False
+
+    return True
+
+
+async def release_admin(login: str) -> None:
+    """Lets the next signup be admin, `login` wasn't created after all."""
+    await db_settings.delete_one({"_id": "first_admin", "login": login})
+
+
 @router.post(
     "/signup",
     status_code=status.HTTP_200_OK,
@@ -64,31 +169,37 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
 )
 async def signup(user_auth: UserAuth):
 
-    no_users = not len(UserSerializer.list_serialize(db_users.find({})))
-
-    check_users = UserSerializer.list_serialize(
-        db_users.find({"login": user_auth.login})
-    )
-
-    if len(check_users) > 0:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="User already exists."
-        )
+    # Hashed first, so a busy hasher can't leave the admin claim behind.
+    password_hash = await hash_password(user_auth.password)
+    admin = await claim_admin(user_auth.login)
 
-    if no_users:
+    if admin:
         user = User(
             login=user_auth.login,
-            password_hash=hash_password(user_auth.password),
+            password_hash=password_hash,
             roles=["admin"]
         )
     else:
         user = User(
             login=user_auth.login,
-            password_hash=hash_password(user_auth.password)
+            password_hash=password_hash
         )
 
-    db_users.insert_one(dict(user))
+    try:
+        await db_users.insert_one(dict(user))
+    except DuplicateKeyError:
+        if admin:
+            await release_admin(user_auth.login)
+
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="User already exists."
+        )
+    except Exception:
+        if admin:
+            await release_admin(user_auth.login)
+
+        raise
 
     return {"message": "User was created!"}
 
@@ -99,7 +210,12 @@ async def signup(user_auth: UserAuth):
     summary='Returns the list of all users.',
     tags=[tag]
 )
-async def get_users(user: User = Depends(get_current_user)):
+async def get_users(
+    response: Response,
+    limit: Union[int, None] = Query(None, ge=1),
+    after: Union[str, None] = None,
+    user: User = Depends(get_current_user)
+):
 
     if "admin" not in user.roles:
         raise HTTPException(
@@ -107,10 +223,17 @@ async def get_users(user: User = Depends(get_current_user)):
             detail="Admin rights are required."
         )
 
+    after = parse_cursor(after)
     users = SafeUserSerializer.list_serialize(
-        db_users.find()
+        await db_users.find(
+            {"login": {"$gt": after}} if after is not None else {}
+        ).sort(
+            "login", pymongo.ASCENDING
+        ).limit(limit or 0).to_list(length=None)
     )
 
+    set_next_cursor(response, users, limit, "login")
+
     return users
 
 
@@ -123,7 +246,7 @@ async def get_users(user: User = Depends(get_current_user)):
 async def get_user(login: str):
 
     user = SafeUserSerializer.serialize(
-        db_users.find_one({"login": login})
+        await db_users.find_one({"login": login})
     )
 
     if user is None:
@@ -146,10 +269,13 @@ async def update_password(
     user: User = Depends(get_current_user)
 ):
 
-    db_users.update_one(
+    password_hash = await hash_password(update.password)
+
+    await db_users.update_one(
         {"login": user.login},
-        {"$set": {"password_hash": hash_password(update.password)}}
+        {"$set": {"password_hash": password_hash}}
     )
+    await invalidate_user(user.login)
 
     return {"message": "User's password was updated!"}
 
@@ -168,26 +294,18 @@ async def remove_user(login: str, user: User = Depends(get_current_user)):
             detail="Admin rights are required."
         )
 
-    user_to_delete = UserSerializer.serialize(
-        db_users.find_one({"login": login})
+    result = await db_users.delete_one(
+        {"login": login, "roles": {"$ne": "admin"}}
     )
 
-    if user_to_delete is None:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="User doesn't exist."
-        )
-
-    if "admin" in user_to_delete["roles"]:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=(
-                "Admin can't delete himself! " +
-                "Use a command line tools to do such a thing"
-            )
+    if result.deleted_count == 0:
+        await raise_user_error(
+            login,
+            "Admin can't delete himself! " +
+            "Use a command line tools to do such a thing"
         )
 
-    db_users.delete_one({"login": login})
+    await invalidate_user(login)
 
     return {"message": "User was removed!"}
 
@@ -210,38 +328,13 @@ async def set_roles(
             detail="Admin rights are required."
         )
 
-    user_to_update = SafeUserSerializer.serialize(
-        db_users.find_one({"login": login})
+    await check_language_codes(update.codes)
+    await update_roles(
+        login,
+        roles_update("set", update.codes),
+        "You can't add new roles to admin."
     )
-
-    if user_to_update is None:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="User doesn't exist."
-        )
-
-    if "admin" in user_to_update["roles"]:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="You can't add new roles to admin."
-        )
-
-    codes = [
-        lang["code"] for lang in LanguageSerializer.list_serialize(
-            db_languages.find()
-        )
-    ]
-
-    for code in update.codes:
-        if code not in codes:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"There's no such a language with code '{code}' yet."
-            )
-
-    new_codes = list(set(update.codes))
-
-    db_users.update_one({"login": login}, {"$set": {"roles": new_codes}})
+    await invalidate_user(login)
 
     return {"message": "New roles were set to a user's roles."}
 
@@ -264,38 +357,13 @@ async def add_roles(
             detail="Admin rights are required."
         )
 
-    user_to_update = SafeUserSerializer.serialize(
-        db_users.find_one({"login": login})
+    await check_language_codes(update.codes)
+    await update_roles(
+        login,
+        roles_update("add", update.codes),
+        "You can't add new roles to admin."
     )
-
-    if user_to_update is None:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="User doesn't exist."
-        )
-
-    if "admin" in user_to_update["roles"]:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="You can't add new roles to admin."
-        )
-
-    codes = [
-        lang["code"] for lang in LanguageSerializer.list_serialize(
-            db_languages.find()
-        )
-    ]
-
-    for code in update.codes:
-        if code not in codes:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"There's no such a language with code '{code}' yet."
-            )
-
-    new_codes = list(set(user_to_update["roles"] + update.codes))
-
-    db_users.update_one({"login": login}, {"$set": {"roles": new_codes}})
+    await invalidate_user(login)
 
     return {"message": "New roles were added to a user's roles."}
 
@@ -318,37 +386,84 @@ async def delete_role(
             detail="Admin rights are required."
         )
 
-    user_to_update = SafeUserSerializer.serialize(
-        db_users.find_one({"login": login})
+    await check_language_codes(update.codes)
+    await update_roles(
+        login,
+        roles_update("delete", update.codes),
+        "You can't delete roles from admin."
     )
+    await invalidate_user(login)
 
-    if user_to_update is None:
+    return {"message": "Roles were deleted from a user's roles."}
+
+
+@router.put(
+    "/batch/roles",
+    status_code=status.HTTP_200_OK,
+    summary="Sets, adds or deletes the roles of many users at once.",
+    tags=[tag]
+)
+async def update_roles_batch(
+    batch: RolesBatch,
+    user: User = Depends(get_current_user)
+):
+
+    if "admin" not in user.roles:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="User doesn't exist."
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin rights are required."
         )
 
-    if "admin" in user_to_update["roles"]:
+    if len(batch.items) > config.BATCH_MAX_ITEMS:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="You can't delete roles from admin."
+            detail=f"Batch can't contain more than {config.BATCH_MAX_ITEMS} "
+                   "items."
         )
 
-    codes = [
-        lang["code"] for lang in LanguageSerializer.list_serialize(
-            db_languages.find()
-        )
-    ]
-
-    for code in update.codes:
-        if code not in codes:
+    for item in batch.items:
+        if item.action not in ("set", "add", "delete"):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"There's no such a language with code '{code}' yet."
+                detail="Action must be one of 'set', 'add' or 'delete'."
             )
 
-    new_codes = list(set(user_to_update["roles"]) - set(update.codes))
-
-    db_users.update_one({"login": login}, {"$set": {"roles": new_codes}})
-
-    return {"message": "Roles were deleted from a user's roles."}
+    codes = await existing_codes(
+        code for item in batch.items for code in item.codes
+    )
+    roles = {
+        found["login"]: found["roles"]
+        async for found in db_users.find(
+            {"login": {"$in": list({item.login for item in batch.items})}},
+            {"_id": 0, "login": 1, "roles": 1}
+        )
+    }
+
+    results = []
+    requests = []
+
+    for item in batch.items:
+        if item.login not in roles:
+            item_status = "not_found"
+        elif "admin" in roles[item.login]:
+            item_status = "admin"
+        elif not set(item.codes) <= codes:
+            item_status = "unknown_language"
+        else:
+            item_status = "updated"
+            requests.append(UpdateOne(
+                {"login": item.login, "roles": {"$ne": "admin"}},
+                roles_update(item.action, item.codes)
+            ))
+
+        results.append({"login": item.login, "status": item_status})
+
+    # Ordered, so several items for the same user apply in turn.
+    if requests:
+        await db_users.bulk_write(requests, ordered=True)
+        await invalidate_users({
+            result["login"] for result in results
+            if result["status"] == "updated"
+        })
+
+    return results
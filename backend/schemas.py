@@ -1,5 +1,5 @@
-from typing import Dict, Any
-from pymongo.cursor import Cursor
+import orjson
+from typing import Dict, Any, Iterable
 
 
 class BaseSerializer:
@@ -9,9 +9,19 @@ class BaseSerializer:
         return {}
 
     @classmethod
-    def list_serialize(cls, obj_list: Cursor):
+    def list_serialize(cls, obj_list: Iterable):
         return [cls.serialize(obj) for obj in obj_list]
 
+    # Serialized objects only hold JSON types, so they are encoded by
+    # orjson directly instead of going through jsonable_encoder first.
+    @classmethod
+    def render(cls, obj) -> bytes:
+        return orjson.dumps(cls.serialize(obj))
+
+    @classmethod
+    def list_render(cls, obj_list: Iterable) -> bytes:
+        return orjson.dumps(cls.list_serialize(obj_list))
+
 
 class UserSerializer(BaseSerializer):
 
@@ -43,7 +53,8 @@ class LanguageSerializer(BaseSerializer):
         return {
             "id": str(obj["_id"]),
             "code": obj["code"],
-            "name": obj["name"]
+            "name": obj["name"],
+            "fallbacks": obj.get("fallbacks", [])
         } if obj else None
 
 
@@ -58,6 +69,16 @@ class TranslationPageSerializer(BaseSerializer):
         } if obj else None
 
 
+class TranslationPageNameSerializer(BaseSerializer):
+
+    @staticmethod
+    def serialize(obj) -> Dict[str, Any] | None:
+        return {
+            "id": str(obj["_id"]),
+            "name": obj["name"]
+        } if obj else None
+
+
 class TranslationEntrySerializer(BaseSerializer):
 
     @staticmethod
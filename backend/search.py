@@ -0,0 +1,302 @@
+import asyncio
+import heapq
+import config
+from typing import Any, Dict, Iterator, List, Set, Tuple, Union
+from storage import TranslationStore, translation_store
+from changelog import ChangeLog, ChangeLogExpired, change_log
+
+GRAM_SIZE = 3
+
+# (page, key), the order search results are returned in.
+EntryId = Tuple[str, str]
+
+
+def _grams(text: str) -> Iterator[str]:
+    for i in range(len(text) - GRAM_SIZE + 1):
+        yield text[i:i + GRAM_SIZE]
+
+
+def _matches(text: Union[str, None], query: str, prefix: bool) -> bool:
+    if not isinstance(text, str):
+        return False
+
+    text = text.casefold()
+
+    return text.startswith(query) if prefix else query in text
+
+
+class Snapshot:
+    """Entries and their trigram postings as of some change log revision.
+
+    Only the texts of `langs` are kept and indexed.
+    """
+
+    def __init__(self, langs: Set[str]) -> None:
+        self.langs = langs
+        self.entries: Dict[EntryId, Dict[str, str]] = {}
+        self.pages: Dict[str, Set[EntryId]] = {}
+        self.grams: Dict[str, Set[EntryId]] = {}
+
+    def _texts(self, entry_id: EntryId) -> Iterator[str]:
+        yield entry_id[1]
+
+        for text in self.entries[entry_id].values():
+            if isinstance(text, str):
+                yield text
+
+    def _index(self, entry_id: EntryId) -> None:
+        for text in self._texts(entry_id):
+            for gram in _grams(text.casefold()):
+                self.grams.setdefault(gram, set()).add(entry_id)
+
+    def _unindex(self, entry_id: EntryId) -> None:
+        for text in self._texts(entry_id):
+            for gram in _grams(text.casefold()):
+                ids = self.grams.get(gram)
+
+                if ids is not None:
+                    ids.discard(entry_id)
+
+                    if not ids:
+                        del self.grams[gram]
+
+    def put(self, entry_id: EntryId, translations: Dict[str, str]) -> None:
+        if entry_id in self.entries:
+            self._unindex(entry_id)
+
+        translations = {
+            lang: text
+            for lang, text in translations.items() if lang in self.langs
+        }
+
+        self.entries[entry_id] = translations
+        self.pages.setdefault(entry_id[0], set()).add(entry_id)
+        self._index(entry_id)
+
+    def remove(self, entry_id: EntryId) -> None:
+        if entry_id not in self.entries:
+            return
+
+        self._unindex(entry_id)
+        del self.entries[entry_id]
+        self.pages.get(entry_id[0], set()).discard(entry_id)
+
+    def remove_page(self, page_name: str) -> None:
+        for entry_id in self.pages.pop(page_name, set()):
+            self.remove(entry_id)
+
+    def apply(self, pages: Dict[str, Dict[str, Any]]) -> None:
+        for page_name, page in pages.items():
+            if page.get("deleted") or page["reset"]:
+                self.remove_page(page_name)
+
+            if page.get("deleted"):
+                continue
+
+            self.pages.setdefault(page_name, set())
+
+            for key, entry in page["entries"].items():
+                entry_id = (page_name, key)
+
+                if entry is None:
+                    self.remove(entry_id)
+                    continue
+
+                translations = {} if entry["reset"] else \
+                    dict(self.entries.get(entry_id, {}))
+                translations.update(entry["translations"])
+                self.put(entry_id, translations)
+
+
+class SearchIndex:
+    """In-memory trigram index over entry keys and translated texts.
+
+    Only the texts of `langs` are held and searched, an index without
+    languages is disabled. It is loaded from the store in the
+    background on the first search and then kept current by replaying
+    the change log before every query, so writes made by other workers
+    are found as well. Queries shorter than a trigram scan the entries
+    of the requested pages instead.
+    """
+
+    def __init__(
+        self,
+        store: TranslationStore,
+        log: ChangeLog,
+        langs: Union[List[str], None] = None
+    ) -> None:
+        self._store = store
+        self._log = log
+        self._langs = set(langs or [])
+        self._lock = asyncio.Lock()
+        self._revision: Union[int, None] = None
+        self._snapshot: Union[Snapshot, None] = None
+        self._building: Union[asyncio.Task, None] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._langs)
+
+    async def _build(self) -> None:
+        # Changes made while loading are replayed on top afterwards.
+        revision = await self._log.revision()
+        snapshot = Snapshot(self._langs)
+
+        async for page in self._store.iter_pages(
+            langs=sorted(self._langs),
+            batch_size=config.EXPORT_BATCH_SIZE
+        ):
+            snapshot.pages.setdefault(page["name"], set())
+
+            for entry in page["entries"]:
+                snapshot.put(
+                    (page["name"], entry["key"]),
+                    entry["translations"]
+                )
+
+        async with self._lock:
+            self._snapshot = snapshot
+            self._revision = revision
+
+    def start(self) -> asyncio.Task:
+        """Starts loading a fresh index unless a load is running already.
+
+        Searches keep using the current index until the new one is done.
+        """
+        if self._building is None or self._building.done():
+            self._building = asyncio.create_task(self._build())
+
+        return self._building
+
+    async def sync(self) -> Snapshot:
+        if self._snapshot is None:
+            # Nothing to search yet, wait for the first load. Shielded
+            # so a cancelled search doesn't abort it for everyone else.
+            await asyncio.shield(self.start())
+
+        async with self._lock:
+            while True:
+                try:
+                    changes = await self._log.since(
+                        self._revision,
+                        config.CHANGES_BATCH_SIZE
+                    )
+                except ChangeLogExpired:
+                    # Serve what we have while the new index loads.
+                    self.start()
+                    break
+
+                self._snapshot.apply(changes["pages"])
+                stalled = changes["revision"] == self._revision
+                self._revision = changes["revision"]
+
+                # Either caught up or waiting for a write still in flight.
+                if changes["complete"] or stalled:
+                    break
+
+            return self._snapshot
+
+    def _candidates(
+        self,
+        snapshot: Snapshot,
+        query: str,
+        pages: Union[List[str], None]
+    ) -> Set[EntryId]:
+        if len(query) < GRAM_SIZE:
+            if pages is None:
+                return set(snapshot.entries)
+
+            return set().union(
+                *(snapshot.pages.get(page, ()) for page in pages)
+            )
+
+        # Intersect the smallest posting lists first.
+        postings = sorted(
+            (snapshot.grams.get(gram, set()) for gram in set(_grams(query))),
+            key=len
+        )
+        candidates = set(postings[0])
+
+        for ids in postings[1:]:
+            candidates &= ids
+
+            if not candidates:
+                break
+
+        if pages is not None:
+            candidates = {
+                entry_id for entry_id in candidates if entry_id[0] in pages
+            }
+
+        return candidates
+
+    async def search(
+        self,
+        query: str,
+        langs: Union[List[str], None] = None,
+        pages: Union[List[str], None] = None,
+        in_keys: bool = True,
+        in_texts: bool = True,
+        prefix: bool = False,
+        after: Union[EntryId, None] = None,
+        limit: int = 50
+    ) -> List[Dict[str, Any]]:
+        """Returns matching entries sorted by page and key.
+
+        Matching is case-insensitive. `langs` restricts both the texts
+        searched and the translations returned, `after` continues the
+        listing behind the given (page, key).
+        """
+        snapshot = await self.sync()
+
+        query = query.casefold()
+        candidates = self._candidates(snapshot, query, pages)
+
+        ordered = [
+            entry_id for entry_id in candidates
+            if after is None or entry_id > after
+        ]
+        # Only as much of the order as the results need is produced.
+        heapq.heapify(ordered)
+        results = []
+
+        while ordered:
+            entry_id = heapq.heappop(ordered)
+            translations = snapshot.entries[entry_id]
+
+            if langs is not None:
+                translations = {
+                    lang: text
+                    for lang, text in translations.items() if lang in langs
+                }
+
+            matched = []
+
+            if in_keys and _matches(entry_id[1], query, prefix):
+                matched.append("key")
+
+            if in_texts:
+                matched.extend(
+                    lang for lang, text in translations.items()
+                    if _matches(text, query, prefix)
+                )
+
+            if matched:
+                results.append({
+                    "page": entry_id[0],
+                    "key": entry_id[1],
+                    "translations": translations,
+                    "matched": matched
+                })
+
+                if len(results) >= limit:
+                    break
+
+        return results
+
+
+search_index = SearchIndex(
+    translation_store,
+    change_log,
+    config.SEARCH_LANGUAGES
+)
@@ -0,0 +1,47 @@
+"""Brings the database in line with what the app expects.
+
+Usage:
+    python setup_database.py
+
+Builds the indexes declared in database.INDEXES, rebuilding the ones
+whose definition changed, and counts translation coverage for catalogs
+that predate the counters. gunicorn runs it once before starting the
+workers, `uvicorn main:app` runs it in the lifespan hook instead.
+While MongoDB can't be reached it is retried with a growing delay for
+up to SETUP_DATABASE_TIMEOUT seconds.
+"""
+import asyncio
+import logging
+import time
+import config
+from pymongo.errors import ConnectionFailure
+from database import db_connection
+from coverage import coverage
+
+logger = logging.getLogger(__name__)
+
+
+async def setup() -> None:
+    deadline = time.monotonic() + config.SETUP_DATABASE_TIMEOUT
+    delay = 1.0
+
+    while True:
+        try:
+            await db_connection.ensure_indexes()
+            await coverage.ensure_built()
+            return
+        except ConnectionFailure as e:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise
+            logger.warning(
+                "MongoDB is not reachable yet, retrying in %.0fs: %s",
+                min(delay, remaining), e
+            )
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 2, 30)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(setup())
@@ -0,0 +1,784 @@
+import pymongo
+import config
+from abc import ABC, abstractmethod
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    List,
+    Set,
+    Tuple,
+    Union
+)
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from database import db_connection, db_translations
+
+
+class TranslationStore(ABC):
+    """Storage layout for translation pages and their entries.
+
+    Every method returns documents shaped like the embedded
+    `translations` collection ({"_id", "name", "entries": [...]}),
+    so routes and serializers don't depend on the layout in use.
+    """
+
+    @abstractmethod
+    async def list_pages(
+        self,
+        after: Union[str, None] = None,
+        limit: Union[int, None] = None,
+        names_only: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Returns pages sorted by name, starting after the `after` name.
+
+        With `names_only` the pages come without their entries.
+        """
+
+    @abstractmethod
+    async def get_page(self, name: str) -> Union[Dict[str, Any], None]:
+        ...
+
+    @abstractmethod
+    async def page_exists(self, name: str) -> bool:
+        ...
+
+    @abstractmethod
+    async def add_page(self, name: str) -> bool:
+        """Returns False if the name is taken."""
+
+    @abstractmethod
+    async def delete_page(self, name: str) -> bool:
+        """Returns False if there was no such page."""
+
+    @abstractmethod
+    async def get_entry(
+        self,
+        page_name: str,
+        key: str
+    ) -> Union[Dict[str, Any], None]:
+        ...
+
+    @abstractmethod
+    async def add_entry(self, page_name: str, key: str) -> bool:
+        """Returns False if the page is missing or the key is taken."""
+
+    @abstractmethod
+    async def delete_entry(
+        self,
+        page_name: str,
+        key: str
+    ) -> Union[Dict[str, str], None]:
+        """Returns the translations of the deleted entry.
+
+        None if there was no such entry.
+        """
+
+    @abstractmethod
+    async def set_translation(
+        self,
+        page_name: str,
+        key: str,
+        lang: str,
+        text: str
+    ) -> Union[Dict[str, str], None]:
+        """Returns the translations of the entry from before the write.
+
+        None if there was no such entry.
+        """
+
+    async def set_translations(
+        self,
+        items: List[Tuple[str, str, str, str]],
+        ordered: bool = False
+    ) -> List[str]:
+        """Applies (page, key, lang, text) items with one bulk_write.
+
+        Returns a status per item: "created" for a translation the entry
+        didn't have yet, "updated", "not_found" or "failed". With
+        `ordered` nothing after the first failed write is applied.
+
+        Translations expected to be new are only set while still
+        missing, so concurrent batches creating the same translation
+        count it once between them. When the write created fewer than
+        expected, the ones another write got to first are found by
+        reading them back and get their text in a second write.
+        """
+        existing = await self.get_entries(
+            {(page, key) for page, key, _, _ in items}
+        )
+        translated = {
+            (page, key, lang)
+            for (page, key), translations in existing.items()
+            for lang in translations
+        }
+
+        # Expected statuses, the write settles the created ones.
+        statuses = []
+
+        for page, key, lang, _ in items:
+            if (page, key) not in existing:
+                statuses.append("not_found")
+            elif (page, key, lang) in translated:
+                statuses.append("updated")
+            else:
+                statuses.append("created")
+                translated.add((page, key, lang))
+
+        indexes = [i for i, s in enumerate(statuses) if s != "not_found"]
+
+        if not indexes:
+            return statuses
+
+        matched, failed = await self._bulk_write(
+            [
+                self._set_translation_op(
+                    *items[i],
+                    new=statuses[i] == "created"
+                )
+                for i in indexes
+            ],
+            ordered
+        )
+
+        for j in failed:
+            statuses[indexes[j]] = "failed"
+
+        expected = [i for i in indexes if statuses[i] == "created"]
+        # Plain sets always match, the other matches created something.
+        created = matched - sum(
+            1 for i in indexes if statuses[i] == "updated"
+        )
+
+        if created < len(expected):
+            await self._settle_created(items, statuses, expected, created)
+
+        return statuses
+
+    async def _settle_created(
+        self,
+        items: List[Tuple[str, str, str, str]],
+        statuses: List[str],
+        expected: List[int],
+        created: int
+    ) -> None:
+        """Finds the expected creations another write got to first.
+
+        They didn't match the conditional set, so they get their text
+        now and are reported as updated.
+        """
+        # Later items for the same translation win.
+        final = {
+            items[i][:3]: items[i][3]
+            for i, item_status in enumerate(statuses)
+            if item_status in ("created", "updated")
+        }
+        current = await self.get_entries(
+            {(items[i][0], items[i][1]) for i in expected}
+        )
+        lost = []
+
+        for i in expected:
+            page, key, lang, _ = items[i]
+            text = current.get((page, key), {}).get(lang)
+
+            if text != final[(page, key, lang)]:
+                lost.append(i)
+            elif created > 0:
+                created -= 1
+            else:
+                # The other write set the same text, nothing to redo.
+                statuses[i] = "updated"
+
+        if not lost:
+            return
+
+        _, failed = await self._bulk_write(
+            [
+                self._set_translation_op(*items[i][:3], final[items[i][:3]])
+                for i in lost
+            ],
+            False
+        )
+
+        for j, i in enumerate(lost):
+            statuses[i] = "failed" if j in failed else "updated"
+
+    async def _bulk_write(
+        self,
+        ops: List[UpdateOne],
+        ordered: bool
+    ) -> Tuple[int, List[int]]:
+        """Returns the matched count and the indexes of failed ops."""
+        try:
+            result = await self._entries_collection().bulk_write(
+                ops,
+                ordered=ordered
+            )
+        except BulkWriteError as e:
+            failed = [error["index"] for error in e.details["writeErrors"]]
+
+            if ordered:
+                failed = list(range(failed[0], len(ops)))
+
+            return e.details["nMatched"], failed
+
+        return result.matched_count, []
+
+    @abstractmethod
+    async def get_entries(
+        self,
+        pairs: Set[Tuple[str, str]]
+    ) -> Dict[Tuple[str, str], Dict[str, str]]:
+        """Maps existing (page, key) pairs to their translations."""
+
+    @abstractmethod
+    async def add_pages(self, names: Iterable[str]) -> Set[str]:
+        """Creates missing pages, returns the names that were created."""
+
+    @abstractmethod
+    async def add_entries(self, pairs: Iterable[Tuple[str, str]]) -> None:
+        """Creates missing (page, key) entries in existing pages."""
+
+    @abstractmethod
+    def _entries_collection(self) -> AsyncIOMotorCollection:
+        ...
+
+    @abstractmethod
+    def _set_translation_op(
+        self,
+        page_name: str,
+        key: str,
+        lang: str,
+        text: str,
+        new: bool = False
+    ) -> UpdateOne:
+        """`new` only matches entries without a `lang` translation."""
+
+    @abstractmethod
+    def iter_language(self, lang: str) -> AsyncIterator[Tuple[str, str, str]]:
+        """Yields (page, key, text) for every entry translated to `lang`."""
+
+    @abstractmethod
+    def iter_pages(
+        self,
+        names: Union[List[str], None] = None,
+        langs: Union[List[str], None] = None,
+        batch_size: int = 100
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Yields pages one by one, sorted by name.
+
+        `names` limits the pages and `langs` the translations returned,
+        None means all of them.
+        """
+
+
+class EmbeddedTranslationStore(TranslationStore):
+    """One document per page with an embedded `entries` array."""
+
+    def __init__(self, pages: AsyncIOMotorCollection) -> None:
+        self._pages = pages
+
+    async def list_pages(
+        self,
+        after: Union[str, None] = None,
+        limit: Union[int, None] = None,
+        names_only: bool = False
+    ) -> List[Dict[str, Any]]:
+        return await self._pages.find(
+            {"name": {"$gt": after}} if after is not None else {},
+            {"name": 1} if names_only else None
+        ).sort(
+            [
+                ("name", pymongo.ASCENDING)
+            ]
+        ).limit(limit or 0).to_list(length=None)
+
+    async def get_page(self, name: str) -> Union[Dict[str, Any], None]:
+        return await self._pages.find_one({"name": name})
+
+    async def page_exists(self, name: str) -> bool:
+        return await self._pages.find_one(
+            {"name": name},
+            {"_id": 1}
+        ) is not None
+
+    async def add_page(self, name: str) -> bool:
+        try:
+            await self._pages.insert_one({"name": name, "entries": []})
+        except DuplicateKeyError:
+            return False
+
+        return True
+
+    async def delete_page(self, name: str) -> bool:
+        result = await self._pages.delete_one({"name": name})
+
+        return result.deleted_count > 0
+
+    async def get_entry(
+        self,
+        page_name: str,
+        key: str
+    ) -> Union[Dict[str, Any], None]:
+        page = await self._pages.find_one(
+            {"name": page_name, "entries.key": key},
+            {"_id": 0, "entries": {"$elemMatch": {"key": key}}}
+        )
+
+        return page['entries'][0] if page else None
+
+    async def add_entry(self, page_name: str, key: str) -> bool:
+        result = await self._pages.update_one(
+            {"name": page_name, "entries.key": {"$ne": key}},
+            {
+                "$push": {
+                    'entries': {
+                        "key": key,
+                        "translations": {}
+                    }
+                }
+            }
+        )
+
+        return result.matched_count > 0
+
+    async def delete_entry(
+        self,
+        page_name: str,
+        key: str
+    ) -> Union[Dict[str, str], None]:
+        page = await self._pages.find_one_and_update(
+            {"name": page_name, "entries.key": key},
+            {"$pull": {'entries': {"key": key}}},
+            {"_id": 0, "entries": {"$elemMatch": {"key": key}}}
+        )
+
+        return page['entries'][0].get('translations', {}) if page else None
+
+    async def set_translation(
+        self,
+        page_name: str,
+        key: str,
+        lang: str,
+        text: str
+    ) -> Union[Dict[str, str], None]:
+        page = await self._pages.find_one_and_update(
+            {
+                "name": page_name,
+                "entries.key": key
+            },
+            {
+                "$set": {
+                    f'entries.$.translations.{lang}': text
+                }
+            },
+            {"_id": 0, "entries": {"$elemMatch": {"key": key}}}
+        )
+
+        return page['entries'][0].get('translations', {}) if page else None
+
+    async def get_entries(
+        self,
+        pairs: Set[Tuple[str, str]]
+    ) -> Dict[Tuple[str, str], Dict[str, str]]:
+        entries = {}
+
+        async for page in self._pages.aggregate([
+            {"$match": {"name": {"$in": list({p for p, _ in pairs})}}},
+            {
+                "$project": {
+                    "_id": 0,
+                    "name": 1,
+                    "entries": {
+                        "$filter": {
+                            "input": "$entries",
+                            "cond": {
+                                "$in": [
+                                    "$$this.key",
+                                    list({k for _, k in pairs})
+                                ]
+                            }
+                        }
+                    }
+                }
+            }
+        ]):
+            for entry in page['entries']:
+                if (page['name'], entry['key']) in pairs:
+                    entries[(page['name'], entry['key'])] = \
+                        entry.get('translations', {})
+
+        return entries
+
+    async def add_pages(self, names: Iterable[str]) -> Set[str]:
+        names = list(names)
+        result = await self._pages.bulk_write([
+            UpdateOne(
+                {"name": name},
+                {"$setOnInsert": {"entries": []}},
+                upsert=True
+            )
+            for name in names
+        ])
+
+        return {names[i] for i in result.upserted_ids}
+
+    async def add_entries(self, pairs: Iterable[Tuple[str, str]]) -> None:
+        await self._pages.bulk_write([
+            UpdateOne(
+                {"name": page_name, "entries.key": {"$ne": key}},
+                {"$push": {'entries': {"key": key, "translations": {}}}}
+            )
+            for page_name, key in pairs
+        ])
+
+    def _entries_collection(self) -> AsyncIOMotorCollection:
+        return self._pages
+
+    def _set_translation_op(
+        self,
+        page_name: str,
+        key: str,
+        lang: str,
+        text: str,
+        new: bool = False
+    ) -> UpdateOne:
+        entry: Dict[str, Any] = {"key": key}
+
+        if new:
+            entry[f'translations.{lang}'] = {"$exists": False}
+
+        return UpdateOne(
+            {
+                "name": page_name,
+                "entries": {"$elemMatch": entry}
+            },
+            {
+                "$set": {
+                    f'entries.$.translations.{lang}': text
+                }
+            }
+        )
+
+    async def iter_language(
+        self,
+        lang: str
+    ) -> AsyncIterator[Tuple[str, str, str]]:
+        async for page in self._pages.find(
+            {f'entries.translations.{lang}': {"$exists": True}},
+            {"_id": 0, "name": 1, "entries.key": 1,
+             f'entries.translations.{lang}': 1}
+        ):
+            for entry in page['entries']:
+                translations = entry.get('translations', {})
+
+                if lang in translations:
+                    yield page['name'], entry['key'], translations[lang]
+
+    async def iter_pages(
+        self,
+        names: Union[List[str], None] = None,
+        langs: Union[List[str], None] = None,
+        batch_size: int = 100
+    ) -> AsyncIterator[Dict[str, Any]]:
+        projection: Union[Dict[str, int], None] = None
+
+        if langs is not None:
+            projection = {"name": 1, "entries.key": 1}
+            projection.update(
+                {f'entries.translations.{lang}': 1 for lang in langs}
+            )
+
+        async for page in self._pages.find(
+            {"name": {"$in": names}} if names is not None else {},
+            projection
+        ).sort("name", pymongo.ASCENDING).batch_size(batch_size):
+            for entry in page.setdefault('entries', []):
+                entry.setdefault('translations', {})
+
+            yield page
+
+
+class NormalizedTranslationStore(TranslationStore):
+    """One document per page name plus one document per (page, key).
+
+    Entry writes touch a single small document and stay far away
+    from the 16 MB BSON limit no matter how large a page grows.
+    """
+
+    def __init__(
+        self,
+        pages: AsyncIOMotorCollection,
+        entries: AsyncIOMotorCollection
+    ) -> None:
+        self._pages = pages
+        self._entries = entries
+
+    async def _with_entries(
+        self,
+        page: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        entries = await self._entries.find(
+            {"page": page["name"]},
+            {"_id": 0, "key": 1, "translations": 1}
+        ).sort("_id", pymongo.ASCENDING).to_list(length=None)
+
+        return {**page, "entries": entries}
+
+    async def list_pages(
+        self,
+        after: Union[str, None] = None,
+        limit: Union[int, None] = None,
+        names_only: bool = False
+    ) -> List[Dict[str, Any]]:
+        pages = await self._pages.find(
+            {"name": {"$gt": after}} if after is not None else {}
+        ).sort(
+            [
+                ("name", pymongo.ASCENDING)
+            ]
+        ).limit(limit or 0).to_list(length=None)
+
+        if names_only:
+            return pages
+
+        entries: Dict[str, List[Dict[str, Any]]] = {
+            page["name"]: [] for page in pages
+        }
+
+        async for entry in self._entries.find(
+            {"page": {"$in": list(entries)}} if limit or after else {}
+        ).sort(
+            "_id", pymongo.ASCENDING
+        ):
+            entries.setdefault(entry["page"], []).append({
+                "key": entry["key"],
+                "translations": entry["translations"]
+            })
+
+        return [
+            {**page, "entries": entries[page["name"]]} for page in pages
+        ]
+
+    async def get_page(self, name: str) -> Union[Dict[str, Any], None]:
+        page = await self._pages.find_one({"name": name})
+
+        return await self._with_entries(page) if page else None
+
+    async def page_exists(self, name: str) -> bool:
+        return await self._pages.find_one(
+            {"name": name},
+            {"_id": 1}
+        ) is not None
+
+    async def add_page(self, name: str) -> bool:
+        try:
+            await self._pages.insert_one({"name": name})
+        except DuplicateKeyError:
+            return False
+
+        return True
+
+    async def delete_page(self, name: str) -> bool:
+        # Entries go first, so a failure halfway leaves an empty page
+        # rather than orphans. The second pass removes entries added
+        # in between, add_entry() removes the ones added after it.
+        await self._entries.delete_many({"page": name})
+        result = await self._pages.delete_one({"name": name})
+
+        if result.deleted_count == 0:
+            return False
+
+        await self._entries.delete_many({"page": name})
+
+        return True
+
+    async def get_entry(
+        self,
+        page_name: str,
+        key: str
+    ) -> Union[Dict[str, Any], None]:
+        return await self._entries.find_one(
+            {"page": page_name, "key": key},
+            {"_id": 0, "key": 1, "translations": 1}
+        )
+
+    async def add_entry(self, page_name: str, key: str) -> bool:
+        if not await self.page_exists(page_name):
+            return False
+
+        try:
+            result = await self._entries.insert_one(
+                {"page": page_name, "key": key, "translations": {}}
+            )
+        except DuplicateKeyError:
+            return False
+
+        # The page may have been deleted since it was checked.
+        if not await self.page_exists(page_name):
+            await self._entries.delete_one({"_id": result.inserted_id})
+            return False
+
+        return True
+
+    async def delete_entry(
+        self,
+        page_name: str,
+        key: str
+    ) -> Union[Dict[str, str], None]:
+        entry = await self._entries.find_one_and_delete(
+            {"page": page_name, "key": key},
+            {"_id": 0, "translations": 1}
+        )
+
+        return entry['translations'] if entry else None
+
+    async def set_translation(
+        self,
+        page_name: str,
+        key: str,
+        lang: str,
+        text: str
+    ) -> Union[Dict[str, str], None]:
+        entry = await self._entries.find_one_and_update(
+            {"page": page_name, "key": key},
+            {"$set": {f'translations.{lang}': text}},
+            {"_id": 0, "translations": 1}
+        )
+
+        return entry['translations'] if entry else None
+
+    async def get_entries(
+        self,
+        pairs: Set[Tuple[str, str]]
+    ) -> Dict[Tuple[str, str], Dict[str, str]]:
+        entries = {}
+
+        async for entry in self._entries.find(
+            {
+                "page": {"$in": list({page for page, _ in pairs})},
+                "key": {"$in": list({key for _, key in pairs})}
+            },
+            {"_id": 0}
+        ):
+            if (entry['page'], entry['key']) in pairs:
+                entries[(entry['page'], entry['key'])] = entry['translations']
+
+        return entries
+
+    async def add_pages(self, names: Iterable[str]) -> Set[str]:
+        names = list(names)
+        result = await self._pages.bulk_write([
+            UpdateOne({"name": name}, {"$set": {"name": name}}, upsert=True)
+            for name in names
+        ])
+
+        return {names[i] for i in result.upserted_ids}
+
+    async def add_entries(self, pairs: Iterable[Tuple[str, str]]) -> None:
+        pairs = list(pairs)
+
+        try:
+            await self._entries.insert_many(
+                [
+                    {"page": page_name, "key": key, "translations": {}}
+                    for page_name, key in pairs
+                ],
+                ordered=False
+            )
+        except BulkWriteError as e:
+            if any(
+                error["code"] != 11000 for error in e.details["writeErrors"]
+            ):
+                raise
+
+        # Same as add_entry(), drop entries of pages deleted meanwhile.
+        names = {page_name for page_name, _ in pairs}
+        existing = {
+            page["name"] async for page in self._pages.find(
+                {"name": {"$in": list(names)}},
+                {"_id": 0, "name": 1}
+            )
+        }
+
+        if names - existing:
+            await self._entries.delete_many(
+                {"page": {"$in": list(names - existing)}}
+            )
+
+    def _entries_collection(self) -> AsyncIOMotorCollection:
+        return self._entries
+
+    def _set_translation_op(
+        self,
+        page_name: str,
+        key: str,
+        lang: str,
+        text: str,
+        new: bool = False
+    ) -> UpdateOne:
+        query: Dict[str, Any] = {"page": page_name, "key": key}
+
+        if new:
+            query[f'translations.{lang}'] = {"$exists": False}
+
+        return UpdateOne(query, {"$set": {f'translations.{lang}': text}})
+
+    async def iter_language(
+        self,
+        lang: str
+    ) -> AsyncIterator[Tuple[str, str, str]]:
+        async for entry in self._entries.find(
+            {f'translations.{lang}': {"$exists": True}},
+            {"_id": 0, "page": 1, "key": 1, f'translations.{lang}': 1}
+        ):
+            yield entry['page'], entry['key'], entry['translations'][lang]
+
+    async def iter_pages(
+        self,
+        names: Union[List[str], None] = None,
+        langs: Union[List[str], None] = None,
+        batch_size: int = 100
+    ) -> AsyncIterator[Dict[str, Any]]:
+        projection = {"_id": 0, "key": 1, "translations": 1}
+
+        if langs is not None:
+            projection = {"_id": 0, "key": 1}
+            projection.update(
+                {f'translations.{lang}': 1 for lang in langs}
+            )
+
+        async for page in self._pages.find(
+            {"name": {"$in": names}} if names is not None else {}
+        ).sort("name", pymongo.ASCENDING).batch_size(batch_size):
+            entries = []
+
+            async for entry in self._entries.find(
+                {"page": page["name"]},
+                projection
+            ).sort("_id", pymongo.ASCENDING).batch_size(batch_size):
+                entry.setdefault('translations', {})
+                entries.append(entry)
+
+            yield {**page, "entries": entries}
+
+
+def create_translation_store(layout: str) -> TranslationStore:
+    if layout == 'embedded':
+        return EmbeddedTranslationStore(db_translations)
+
+    if layout == 'normalized':
+        return NormalizedTranslationStore(
+            db_connection.getCollection("translation_pages"),
+            db_connection.getCollection("translation_entries")
+        )
+
+    raise ValueError(f"Unknown translations layout '{layout}'.")
+
+
+translation_store: TranslationStore = create_translation_store(
+    config.TRANSLATIONS_LAYOUT
+)
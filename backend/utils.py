@@ -1,18 +1,117 @@
+import asyncio
+import hashlib
+import time
 import config
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Union, Any
+from email.utils import formatdate, parsedate_to_datetime
+from typing import (
+    Union,
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    NamedTuple,
+    Tuple
+)
+from urllib.parse import quote, unquote
+from fastapi import HTTPException, Request, Response, status
 from jose import jwt
 from passlib.context import CryptContext
+from metrics import PASSWORD_HASH_QUEUE
 
-password_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hashes made with a different cost are flagged by needs_update()
+# and transparently rehashed on the next successful login.
+password_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=config.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=config.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=config.BCRYPT_ROUNDS
+)
 
 
-def hash_password(password: str) -> str:
-    return password_context.hash(password)
+class PasswordHasher:
+    """Runs bcrypt in a bounded thread pool off the event loop.
 
+    bcrypt releases the GIL, so `workers` hashes run in parallel while
+    other requests keep being served. Calls beyond `max_queue` waiting
+    ones are rejected with 503 instead of piling up.
+    """
 
-def verify_hash(password: str, hashed_pass: str) -> bool:
-    return password_context.verify(password, hashed_pass)
+    def __init__(self, workers: int, max_queue: int) -> None:
+        self.workers = workers
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers,
+            thread_name_prefix="password-hasher"
+        )
+
+    @property
+    def queued(self) -> int:
+        return max(0, self.in_flight - self.workers)
+
+    async def _run(self, func: Callable, *args: Any) -> Any:
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, try again later."
+            )
+
+        self.in_flight += 1
+        PASSWORD_HASH_QUEUE.set(self.queued)
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, func, *args
+            )
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            PASSWORD_HASH_QUEUE.set(self.queued)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(password_context.hash, password)
+
+    async def verify_and_update(
+        self,
+        password: str,
+        hashed_pass: str
+    ) -> Tuple[bool, Union[str, None]]:
+        """Returns the verification result and a new hash if one is due."""
+        return await self._run(
+            password_context.verify_and_update,
+            password,
+            hashed_pass
+        )
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "completed": self.completed,
+            "rejected": self.rejected
+        }
+
+
+password_hasher = PasswordHasher(
+    config.PASSWORD_HASH_WORKERS,
+    config.PASSWORD_HASH_MAX_QUEUE
+)
+
+
+async def hash_password(password: str) -> str:
+    return await password_hasher.hash(password)
 
 
 def create_jwt_token(
@@ -30,3 +129,173 @@ def create_jwt_token(
     encoded_jwt = jwt.encode(to_encode, secret, config.ALGORITHM)
 
     return encoded_jwt
+
+
+def next_cursor(
+    items: List[Dict[str, Any]],
+    limit: Union[int, None],
+    *fields: str
+) -> Union[str, None]:
+    """Returns where the next page of a keyset paginated listing starts.
+
+    The values are percent-encoded, headers only carry latin-1 text,
+    and joined with "/" when the listing is sorted by several fields.
+    """
+    if limit and len(items) == limit:
+        return "/".join(
+            quote(items[-1][field], safe="") for field in fields
+        )
+
+    return None
+
+
+def parse_cursor(after: Union[str, None]) -> Union[str, None]:
+    """Decodes an `after` parameter taken from X-Next-After."""
+    return unquote(after) if after is not None else None
+
+
+def parse_cursor_fields(
+    after: Union[str, None],
+    count: int
+) -> Union[Tuple[str, ...], None]:
+    """Decodes an `after` parameter made of `count` fields."""
+    if after is None:
+        return None
+
+    fields = after.split("/")
+
+    if len(fields) != count:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Malformed cursor."
+        )
+
+    return tuple(unquote(field) for field in fields)
+
+
+def set_next_cursor(
+    response: Response,
+    items: List[Dict[str, Any]],
+    limit: Union[int, None],
+    *fields: str
+) -> None:
+    """Points clients to the next page of a keyset paginated listing."""
+    cursor = next_cursor(items, limit, *fields)
+
+    if cursor is not None:
+        response.headers["X-Next-After"] = cursor
+
+
+class Representation(NamedTuple):
+    """A rendered response body along with its validators."""
+    body: bytes
+    etag: str
+    last_modified: int
+
+
+class LastModified:
+    """Hands out Last-Modified seconds that grow with every new body.
+
+    The last one given out is remembered per resource, a different body
+    always gets a later second than it, an identical body keeps it.
+    Without a remembered one the second after the latest write is the
+    floor, so bodies rendered before that write are never considered
+    newer by If-Modified-Since.
+    """
+
+    def __init__(self, max_items: int) -> None:
+        self._max_items = max_items
+        self._items: OrderedDict[Hashable, Tuple[str, int]] = OrderedDict()
+
+    def next(self, key: Hashable, etag: str, modified_at: float) -> int:
+        last_modified = max(int(time.time()), int(modified_at) + 1)
+        previous = self._items.get(key)
+
+        if previous is not None:
+            if previous[0] == etag:
+                last_modified = previous[1]
+            else:
+                last_modified = max(last_modified, previous[1] + 1)
+
+        self._items[key] = (etag, last_modified)
+        self._items.move_to_end(key)
+
+        while len(self._items) > self._max_items:
+            self._items.popitem(last=False)
+
+        return last_modified
+
+
+# Kept well beyond the cached representations, so they outlive eviction.
+last_modified = LastModified(config.CACHE_MAX_ITEMS * 16)
+
+
+def represent(
+    body: bytes,
+    key: Hashable,
+    modified_at: float = 0.0
+) -> Representation:
+    """Computes the strong ETag and Last-Modified of resource `key`.
+
+    `modified_at` is when the data was last written.
+    """
+    etag = '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+
+    return Representation(
+        body,
+        etag,
+        last_modified.next(key, etag, modified_at)
+    )
+
+
+def _not_modified(request: Request, representation: Representation) -> bool:
+    # If-Modified-Since is only looked at without If-None-Match.
+    if_none_match = request.headers.get("if-none-match")
+
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+
+        return "*" in tags or any(
+            tag.removeprefix("W/") == representation.etag for tag in tags
+        )
+
+    if_modified_since = request.headers.get("if-modified-since")
+
+    if if_modified_since is None:
+        return False
+
+    try:
+        since = parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+    return representation.last_modified <= since
+
+
+def conditional_response(
+    request: Request,
+    representation: Representation,
+    headers: Union[Dict[str, str], None] = None
+) -> Response:
+    """Answers with 304 when the client's copy is still current."""
+    headers = {
+        **(headers or {}),
+        "ETag": representation.etag,
+        "Last-Modified": formatdate(
+            representation.last_modified,
+            usegmt=True
+        ),
+        "Cache-Control": f"public, max-age={config.HTTP_CACHE_MAX_AGE}"
+    }
+
+    if _not_modified(request, representation):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers=headers
+        )
+
+    return Response(
+        representation.body,
+        media_type="application/json",
+        headers=headers
+    )